@@ -1,13 +1,47 @@
 import streamlit as st
+import functools
+import itertools
 import json
-import webbrowser
-from PIL import Image
+import subprocess
+import time
 from graph import Graph
+from metrics import Metrics, instrument_graph, uninstrument_graph
+from store import graph_registry
+from render import (is_graphviz_available, get_layout_svg, get_mode_timeout, get_render_size, render_digraph, 
+                    render_mode_descriptions, RenderWorker)
 
 
 # Set page config
 st.set_page_config(page_title="Graphlit", page_icon="🔍", layout="wide")
 
+# Time each rerun of the app
+rerun_start = time.perf_counter()
+rerun_metrics = Metrics()
+
+# Load the logo and static sidebar content once per process instead of on every rerun
+@st.cache_resource
+def load_logo():
+    # Returns the decoded logo image
+    from PIL import Image
+    image = Image.open(f"{__file__.rsplit('/', 1)[0]}/logo.png")
+    image.load()
+    return image
+
+@st.cache_resource
+def load_sidebar_content():
+    # Returns the summary, feature list and links shown in the sidebar
+    return {"summary": "Graphlit is a Streamlit app for creating, editing, and visualizing graphs. Users can upload JSON files with graph structures or build graphs from scratch using the input fields provided.",
+            "features": '''
+                        1. Upload JSON files containing graph structure (clusters, nodes, edges).
+                        2. Add, edit, or remove nodes and edges.
+                        3. Create and visualize subgraphs by selecting clusters.
+                        4. Export subgraphs or entire graph structures as JSON files.
+                        5. Search node text to find nodes and select their clusters.
+                        6. Analyse node degrees, PageRank and cluster-to-cluster and rank-to-rank edge counts.
+                        ''',
+            "links": ["See our [GitHub Page](https://github.com/mitch-parker/graphlit) for further details.",
+                      "[![Twitter URL](https://img.shields.io/twitter/url/https/twitter.com/bukotsunikki.svg?style=social&label=Follow%20%40Mitch_P)](https://twitter.com/Mitch_P)"]}
+
 # Set the app's title
 title_cols = st.columns([1, 4])
 
@@ -15,26 +49,19 @@ title_cols[1].markdown("# Graphlit 🔍")
 title_cols[1].markdown("#### A Streamlit app for creating, editing, and visualizing graphs")
 title_cols[1].markdown("**Developed by Mitchell Parker**")
 
-image = Image.open(f"{__file__.rsplit('/', 1)[0]}/logo.png")
-title_cols[0].image(image)
+title_cols[0].image(load_logo())
 title_cols[0].markdown("Powered by [GraphViz](https://graphviz.org).")
 
 # Add summary of app in sidebar
+sidebar_content = load_sidebar_content()
 st.sidebar.markdown("## Summary")
-st.sidebar.markdown("Graphlit is a Streamlit app for creating, editing, and visualizing graphs. Users can upload JSON files with graph structures or build graphs from scratch using the input fields provided.")
+st.sidebar.markdown(sidebar_content["summary"])
 
 with st.sidebar.expander("Features"):
-    st.markdown(
-        '''
-        1. Upload JSON files containing graph structure (clusters, nodes, edges).
-        2. Add, edit, or remove nodes and edges.
-        3. Create and visualize subgraphs by selecting clusters.
-        4. Export subgraphs or entire graph structures as JSON files.
-        '''
-    )
-
-st.sidebar.markdown("See our [GitHub Page](https://github.com/mitch-parker/graphlit) for further details.")
-st.sidebar.markdown("[![Twitter URL](https://img.shields.io/twitter/url/https/twitter.com/bukotsunikki.svg?style=social&label=Follow%20%40Mitch_P)](https://twitter.com/Mitch_P)")
+    st.markdown(sidebar_content["features"])
+
+for sidebar_link in sidebar_content["links"]:
+    st.sidebar.markdown(sidebar_link)
 
 # Add a divider under the app's title
 st.markdown("---")
@@ -51,6 +78,10 @@ if "hide_rank" not in st.session_state:
     st.session_state.hide_rank = False
 if "rankdir_lr" not in st.session_state:
     st.session_state.rankdir_lr = False
+if "collapse_unselected" not in st.session_state:
+    st.session_state.collapse_unselected = False
+if "keep_layout" not in st.session_state:
+    st.session_state.keep_layout = False
 
 if "cluster_fillcolor" not in st.session_state:
     st.session_state.cluster_fillcolor = ""
@@ -64,10 +95,48 @@ if "words_per_node" not in st.session_state:
     st.session_state.words_per_node = ""
 if "words_per_node_line" not in st.session_state:
     st.session_state.words_per_node_line = ""
+if "max_rank_nodes" not in st.session_state:
+    st.session_state.max_rank_nodes = ""
 
 if "show_graph" not in st.session_state:
     st.session_state.show_graph = False  
 
+# Cache of values derived from the graph (name -> (key, value))
+if "derived_cache" not in st.session_state:
+    st.session_state.derived_cache = {}
+
+def get_derived(name, key, compute):
+    # Returns a value(name) derived from the graph, only recomputing it when its key(key) changes
+    # Keys start with the graph version so any edit to the graph invalidates them
+    if name not in st.session_state.derived_cache or st.session_state.derived_cache[name][0] != key:
+        st.session_state.derived_cache[name] = (key, compute())
+    return st.session_state.derived_cache[name][1]
+
+def get_node_id_options():
+    # Returns the node IDs of the current graph
+    return get_derived("node_ids", st.session_state.graph.version, st.session_state.graph.get_node_ids)
+
+# Most node IDs offered by a node selectbox, so large graphs are never sent to the browser whole
+max_node_options = 50
+
+def get_node_id_choices(container, query_key):
+    # Returns at most max_node_options node IDs for a selectbox, matching the search box with key(query_key) in a container(container)
+    node_query = container.text_input("Search Nodes", key=query_key)
+    if node_query != "":
+        node_search_ids = st.session_state.graph.search_nodes(node_query, max_results=max_node_options)
+        if len(node_search_ids) > 0:
+            return node_search_ids
+        container.info("No matching nodes found.")
+
+    node_id_options = get_node_id_options()
+    if len(node_id_options) > max_node_options:
+        container.caption(f"Showing the first {max_node_options} of {len(node_id_options)} nodes. Search to find others.")
+    return node_id_options[:max_node_options]
+
+def get_cluster_id_options():
+    # Returns the cluster IDs of the current graph
+    return get_derived("cluster_ids", st.session_state.graph.version, st.session_state.graph.get_cluster_ids)
+
 # Add option to clear graph and load example
 clear_example_cols = st.sidebar.columns(2)
 clear_example_cols[0].markdown("## Reset")
@@ -98,20 +167,34 @@ if clear_example_cols[1].button("Load Graph", key="load_example"):
 
 # Allow user to upload a JSON file
 st.sidebar.markdown("## Upload")
-uploaded_file = st.sidebar.file_uploader("Upload JSON (Optional)")
+uploaded_files = st.sidebar.file_uploader("Upload JSON (Optional)", accept_multiple_files=True)
 
-# If a JSON file is uploaded, load the file into a Graph object
-if uploaded_file is not None:
+# Several JSON files are merged into one graph, resolving node IDs found in more than one file by a rule
+node_conflict = "last"
+if len(uploaded_files) > 1:
+    node_conflict = st.sidebar.selectbox("Clashing Node IDs", st.session_state.graph.node_conflicts, index=1, key="node_conflict",
+                                         help="Keep the first or last file's node, merge their attributes, rename later nodes or stop with an error.")
+
+# If JSON files are uploaded, load them into a Graph object shared with other sessions viewing the same files
+if len(uploaded_files) > 0:
     if st.sidebar.button("Load Graph", key="load_file"):
-        uploaded_json = json.loads(uploaded_file.read())
-        st.session_state.graph = Graph(clusters=uploaded_json["clusters"],
-                                        nodes=uploaded_json["nodes"],
-                                        edges=uploaded_json["edges"])
-        st.session_state.subgraph_cluster_ids = []
-        st.session_state.show_graph = True
+        try:
+            st.session_state.graph = graph_registry.load_graphs([x.getvalue() for x in uploaded_files], node_conflict=node_conflict)
+            st.session_state.subgraph_cluster_ids = []
+            st.session_state.show_graph = True
+        except ValueError as e:
+            st.sidebar.error(str(e))
+
+# Allow user to time graph operations for each rerun
+st.sidebar.markdown("## Profiling")
+show_timings = st.sidebar.checkbox("Show Timings", value=False, key="show_timings")
+if show_timings:
+    instrument_graph(st.session_state.graph, rerun_metrics)
+else:
+    uninstrument_graph(st.session_state.graph)
         
 # Determine if graph already has nodes, which will inform the layout
-graph_has_nodes = len(st.session_state.graph.get_node_ids()) > 0
+graph_has_nodes = len(get_node_id_options()) > 0
 
 # Create layout columns for the app
 if graph_has_nodes:
@@ -158,7 +241,8 @@ bottom_node_subcols = node_col.columns(total_bottom)
 
 # Configure input fields for node ID, cluster, rank, and text
 if not add_mode:
-    node_id = bottom_node_subcols[0].selectbox("Node", st.session_state.graph.get_node_ids(), key="node_id")
+    node_id_options = get_node_id_choices(node_col, "node_query")
+    node_id = bottom_node_subcols[0].selectbox("Node", node_id_options, key="node_id")
 
 node_attr_keys = [st.session_state.graph.cluster_attr, st.session_state.graph.rank_attr,
                 st.session_state.graph.text_attr, st.session_state.graph.fillcolor_attr,
@@ -240,13 +324,13 @@ else:
             st.session_state.graph.remove_nodes(node_id, edit_mode=True)
             st.session_state.graph.add_nodes(node_ids=node_id, node_attr=node_attr)
 
-            st.session_state.subgraph_cluster_ids = [x for x in st.session_state.subgraph_cluster_ids if x in st.session_state.graph.get_cluster_ids()]
+            st.session_state.subgraph_cluster_ids = [x for x in st.session_state.subgraph_cluster_ids if x in get_cluster_id_options()]
             st.session_state.show_graph = True
 
         if node_col.button("Remove", key="remove_nodes"):
             st.session_state.graph.remove_nodes(node_id)
 
-            st.session_state.subgraph_cluster_ids = [x for x in st.session_state.subgraph_cluster_ids if x in st.session_state.graph.get_cluster_ids()]
+            st.session_state.subgraph_cluster_ids = [x for x in st.session_state.subgraph_cluster_ids if x in get_cluster_id_options()]
             st.session_state.show_graph = True
 
 # If graph has node add edges panel
@@ -280,18 +364,23 @@ if graph_has_nodes:
             from_to_level = edge_subcols[i].radio(f"{from_to_title} Level", from_to_level_options, index=len(from_to_level_options)-1, key=f"{from_to}_level")
 
         # Configure input fields for start and end nodes of edges
+        from_to_cluster_ids = None
+        from_to_rank_ids = None
         if from_to_level=="Cluster" or from_to_level=="Rank":
-            from_to_cluster_ids = edge_subcols[i].selectbox(f"{from_to_title} Cluster", st.session_state.graph.get_cluster_ids(), key=f"{from_to}_cluster_ids")
+            from_to_cluster_ids = edge_subcols[i].selectbox(f"{from_to_title} Cluster", get_cluster_id_options(), key=f"{from_to}_cluster_ids")
             if from_to_level == "Rank":
                 from_to_rank_ids = edge_subcols[i].selectbox(f"{from_to_title} Rank", st.session_state.graph.get_cluster_rank_ids(from_to_cluster_ids), key=f"{from_to}_rank_ids")
                 from_to_node_ids = st.session_state.graph.get_cluster_rank_node_ids(from_to_cluster_ids, from_to_rank_ids)
             else:
                 from_to_node_ids = st.session_state.graph.get_cluster_node_ids(from_to_cluster_ids)
         elif from_to_level == "Node":    
-            from_to_node_ids = edge_subcols[i].selectbox(f"{from_to_title} Node", st.session_state.graph.get_node_ids(), key=f"{from_to}_node_ids")
+            from_to_node_id_options = get_node_id_choices(edge_subcols[i], f"{from_to}_node_query")
+            from_to_node_ids = edge_subcols[i].selectbox(f"{from_to_title} Node", from_to_node_id_options, key=f"{from_to}_node_ids")
           
         from_to_select[from_to]["node_ids"] = from_to_node_ids
         from_to_select[from_to]["level"] = from_to_level
+        from_to_select[from_to]["cluster_id"] = from_to_cluster_ids
+        from_to_select[from_to]["rank_id"] = from_to_rank_ids
     
     # Extract selected to and from IDs
     from_node_ids = from_to_select["from"]["node_ids"]
@@ -310,7 +399,7 @@ if graph_has_nodes:
         else:
             edge_val = ""
         if (from_level == "Node") and (to_level == "Node"):
-            if st.session_state.graph.join_edge_id(from_node_ids, to_node_ids) in st.session_state.graph.get_edge_ids():
+            if st.session_state.graph.join_edge_id(from_node_ids, to_node_ids) in st.session_state.graph.get_edges():
                 if st.session_state.graph.is_edge_attr(from_node_ids, to_node_ids, attr_key):
                     edge_val = st.session_state.graph.get_edge_attr(from_node_ids, to_node_ids, attr_key)
         edge_values[attr_key] = edge_val
@@ -329,15 +418,34 @@ if graph_has_nodes:
             if attr_val not in ["", edge_optionals[attr_key]]:
                 edge_attr.update({attr_key: attr_val})
 
+    # Connections between clusters or ranks can be kept as one bundle edge instead of every node-to-node edge
+    bundle_edges = False
+    if from_level != "Node" and to_level != "Node":
+        bundle_ends = {"from_cluster_id": from_to_select["from"]["cluster_id"], "from_rank_id": from_to_select["from"]["rank_id"],
+                       "to_cluster_id": from_to_select["to"]["cluster_id"], "to_rank_id": from_to_select["to"]["rank_id"]}
+        bundle_edges = edge_col.checkbox("Bundle Edges", value=False, key="bundle_edges",
+                                         help=f"Store one edge standing for all {len(from_node_ids) * len(to_node_ids)} edges between the selections.")
+
     # Create buttons to add and remove edges
     if edge_col.button("Add/Edit", key="add_edges"):
-        st.session_state.graph.add_edges(from_node_ids, to_node_ids, edge_attr=edge_attr)
+        if bundle_edges:
+            st.session_state.graph.add_bundle(**bundle_ends, edge_attr=edge_attr)
+        else:
+            st.session_state.graph.add_edges(from_node_ids, to_node_ids, edge_attr=edge_attr)
         st.session_state.show_graph = True
 
     if edge_col.button("Remove", key="remove_edges"):
-        st.session_state.graph.remove_edges(from_node_ids, to_node_ids)
+        if bundle_edges:
+            st.session_state.graph.remove_bundle(**bundle_ends)
+        else:
+            st.session_state.graph.remove_edges(from_node_ids, to_node_ids)
         st.session_state.show_graph = True
 
+    if bundle_edges and st.session_state.graph.join_bundle_id(**bundle_ends) in st.session_state.graph.get_bundles():
+        if edge_col.button("Expand", key="expand_bundle"):
+            st.session_state.graph.expand_bundles([st.session_state.graph.join_bundle_id(**bundle_ends)])
+            st.session_state.show_graph = True
+
 # Expander to rename clusters or ranks
 if graph_has_nodes:
     edge_col.markdown("## Clusters")
@@ -365,7 +473,7 @@ if graph_has_nodes:
         cluster_label += "Cluster"
         rank_label += "Rank"
         
-        old_cluster_id = old_cluster_col.selectbox(cluster_label, st.session_state.graph.get_cluster_ids(), key="old_cluster_id")
+        old_cluster_id = old_cluster_col.selectbox(cluster_label, get_cluster_id_options(), key="old_cluster_id")
         if clusters_options == "Rename":
             new_cluster_id = clusters_cols[1].text_input("New Cluster", key="new_cluster_id")
 
@@ -407,24 +515,65 @@ st.markdown("---")
 # SUBGRAPH SECTION
 st.markdown("## Visualization")
 
+# Search node text to seed the cluster selection
+search_cols = st.columns([2, 2])
+search_query = search_cols[0].text_input("Search Nodes", key="search_query")
+
+def format_search_node_id(search_node_id):
+    # Shows matching node IDs with the start of their text
+    search_node_text = st.session_state.graph.get_node_attr(search_node_id, st.session_state.graph.text_attr)
+    return f"{search_node_id}: {' '.join(search_node_text.split()[:8])}"
+
+if search_query != "":
+    search_node_ids = st.session_state.graph.search_nodes(search_query, max_results=25)
+    if len(search_node_ids) == 0:
+        search_cols[1].info("No matching nodes found.")
+    else:
+        search_select_ids = search_cols[1].multiselect("Matching Nodes", search_node_ids,
+                                                       default=search_node_ids,
+                                                       format_func=format_search_node_id,
+                                                       key="search_select_ids")
+        if search_cols[1].button("Select Clusters", key="search_select_clusters"):
+            for search_node_id in search_select_ids:
+                search_cluster_id = st.session_state.graph.get_node_attr(search_node_id, st.session_state.graph.cluster_attr)
+                if search_cluster_id not in st.session_state.subgraph_cluster_ids:
+                    st.session_state.subgraph_cluster_ids = st.session_state.subgraph_cluster_ids + [search_cluster_id]
+            st.session_state.show_graph = True
+
 # Multiselect widget to select clusters for subgraph generation
 subgraph_cols = st.columns([2, 1, 1])
 
 subgraph_cluster_ids = subgraph_cols[0].multiselect("Select Clusters", 
-                                                                        st.session_state.graph.get_cluster_ids(), 
+                                                                        get_cluster_id_options(), 
                                                                         default=st.session_state.subgraph_cluster_ids, 
                                                                         key="select_clusters")
 if subgraph_cluster_ids != st.session_state.subgraph_cluster_ids:
     st.session_state.subgraph_cluster_ids = subgraph_cluster_ids
     st.session_state.show_graph = True
 
-subgraph_node_ids = []
-for cluster_id in st.session_state.subgraph_cluster_ids:
-    for rank_id in st.session_state.graph.get_cluster_rank_ids(cluster_id):
-        subgraph_node_ids += st.session_state.graph.get_cluster_rank_node_ids(cluster_id, rank_id)
-
-# Generate a subgraph based on selected clusters
-subgraph = st.session_state.graph.get_subgraph(subgraph_node_ids)
+def get_selected_subgraph(graph, subgraph_cluster_ids):
+    # Generates a subgraph of a Graph(graph) based on selected clusters(subgraph_cluster_ids)
+    subgraph_node_ids = []
+    for cluster_id in subgraph_cluster_ids:
+        for rank_id in graph.get_cluster_rank_ids(cluster_id):
+            subgraph_node_ids += graph.get_cluster_rank_node_ids(cluster_id, rank_id)
+    with rerun_metrics.timer("subgraph", elements=len(subgraph_node_ids)):
+        return graph.get_subgraph(subgraph_node_ids)
+
+@st.cache_resource(max_entries=8)
+def get_shared_subgraph(_graph, graph_version, subgraph_cluster_ids):
+    # Returns a subgraph of a shared graph(_graph), kept once per process for every session viewing the shared graph
+    # Graph versions are unique within the process, so the version(graph_version) identifies the shared graph
+    return get_selected_subgraph(_graph, subgraph_cluster_ids)
+
+# Sessions still on a shared graph read one subgraph, and only edited graphs keep their own
+subgraph_key = (st.session_state.graph.version, tuple(st.session_state.subgraph_cluster_ids))
+if getattr(st.session_state.graph, "shared", False):
+    st.session_state.derived_cache.pop("subgraph", None)
+    subgraph = get_shared_subgraph(st.session_state.graph, *subgraph_key)
+else:
+    subgraph = get_derived("subgraph", subgraph_key, 
+                           lambda: get_selected_subgraph(st.session_state.graph, st.session_state.subgraph_cluster_ids))
 
 # Layout radio buttons to select graph layout direction
 rankdir_lr = subgraph_cols[1].radio("Layout", ["Top/Bottom", "Left/Right"], horizontal=True) == "Left/Right"
@@ -443,6 +592,21 @@ if hide_rank != st.session_state.hide_rank:
     st.session_state.hide_rank = hide_rank
     st.session_state.show_graph = True
 
+# Add option to show unselected clusters as summary nodes
+collapse_unselected = subgraph_cols[2].checkbox("Collapse Unselected Clusters", value=False)
+if collapse_unselected != st.session_state.collapse_unselected:
+    st.session_state.collapse_unselected = collapse_unselected
+    st.session_state.show_graph = True
+
+# Add option to keep node positions between renders (requires Graphviz on the server)
+keep_layout = subgraph_cols[2].checkbox("Keep Layout", value=False, disabled=not is_graphviz_available("dot"))
+if keep_layout != st.session_state.keep_layout:
+    st.session_state.keep_layout = keep_layout
+    st.session_state.show_graph = True
+
+# Add option to render in the background so the app stays responsive during large layouts
+background_render = subgraph_cols[2].checkbox("Render in Background", value=True)
+
 # Specify cluster and rank colors
 cluster_fillcolor = "lightgrey"
 cluster_fontcolor = "black"
@@ -503,37 +667,283 @@ with st.expander("Optional Input"):
         st.session_state.show_graph = True
     st.session_state.words_per_node_line = words_per_node_line
 
+    max_rank_nodes = visual_option_cols[0].number_input("Max Nodes Per Rank (0 for No Limit)", value=0, min_value=0)
+
+    if max_rank_nodes != st.session_state.max_rank_nodes:
+        st.session_state.show_graph = True
+    st.session_state.max_rank_nodes = max_rank_nodes
+
+    # Limits on what is sent to Graphviz before falling back to a cheaper view
+    render_timeout = visual_option_cols[1].number_input("Render Timeout (Seconds)", value=30, min_value=1)
+    node_budget = visual_option_cols[0].number_input("Node Budget", value=2000, min_value=1)
+    edge_budget = visual_option_cols[1].number_input("Edge Budget", value=5000, min_value=1)
+
     st.markdown("See [Graphviz](https://graphviz.org) for details.")
 
 if st.button("Update Visualization", key="update_visual"):
     st.session_state.show_graph = True
     
-# Display the subgraph diagram if there are selected clusters
-if len(subgraph_node_ids) > 0 and st.session_state.show_graph:
-    st.graphviz_chart(st.session_state.graph.build_digraph(graph=subgraph,
-                        cluster_fillcolor=cluster_fillcolor,
-                        cluster_fontcolor=cluster_fontcolor,
-                        rank_fillcolor=rank_fillcolor,
-                        rank_fontcolor=rank_fontcolor,
-                        words_per_node=words_per_node, 
-                        words_per_node_line=words_per_node_line,
-                        rankdir_lr=rankdir_lr))
+# Draw the whole graph with unselected clusters collapsed, or only the selected clusters
+render_graph = subgraph
+collapse_cluster_ids = None
+if collapse_unselected:
+    render_graph = st.session_state.graph.graph
+    collapse_cluster_ids = [x for x in get_cluster_id_options() if x not in st.session_state.subgraph_cluster_ids]
+
+def get_rendered_graph(graph, digraph_kwargs, keep_layout, layout_key, render_timeout, node_budget, edge_budget, 
+                       graph_version, text_versions, cancel_event=None):
+    # Lays out and renders a graph, returning the render mode, DOT source, SVG, whether node positions were kept
+    # and the metrics timing the layout and render
+    # Makes no Streamlit calls so it can run in the background render worker, so kept positions are stored under
+    # the graph version(graph_version) and node text versions(text_versions) the render was requested for
+    # The layout pass stands in for the full view, taking its share of the timeout(render_timeout) in seconds
+    deadline = time.monotonic() + render_timeout
+    digraph_kwargs = {**digraph_kwargs, "text_versions": text_versions}
+    render_metrics = Metrics()
+    node_positions = {}
+    layout_kept = True
+    skip_modes = None
+    node_count, edge_count = get_render_size(graph, digraph_kwargs)
+    if keep_layout and node_count <= node_budget and edge_count <= edge_budget:
+        # Lay out the graph on the server with dot, starting from the node order kept from the last layout, 
+        # keeping the positions for the next render and the SVG of the full view from the same Graphviz run
+        node_positions = graph.get_kept_positions(layout_key=layout_key, text_versions=text_versions)
+        digraph = graph.build_digraph(node_positions=node_positions, **digraph_kwargs)
+        try:
+            with render_metrics.timer("layout"):
+                layout_positions, svg = get_layout_svg(digraph.source, engine="dot",
+                                                       timeout=get_mode_timeout(deadline, "full"),
+                                                       cancel_event=cancel_event)
+            graph.cache_layout_positions(layout_positions, layout_key=layout_key, version=graph_version, text_versions=text_versions)
+            return "full", digraph.source, svg, layout_kept, render_metrics
+        except subprocess.TimeoutExpired:
+            # The full view is too slow to lay out, so go straight to the cheaper modes
+            node_positions = {}
+            layout_kept = False
+            skip_modes = ["full"]
+        except (OSError, subprocess.SubprocessError, ValueError):
+            node_positions = {}
+            layout_kept = False
+
+    # Render the most detailed view that fits the budgets
+    with render_metrics.timer("render"):
+        render_mode, digraph, svg = render_digraph(graph, {**digraph_kwargs, "node_positions": node_positions},
+                                                   node_budget=node_budget, edge_budget=edge_budget, 
+                                                   timeout=deadline - time.monotonic(),
+                                                   cancel_event=cancel_event, skip_modes=skip_modes)
+    if digraph is None:
+        return render_mode, None, svg, layout_kept, render_metrics
+    return render_mode, digraph.source, svg, layout_kept, render_metrics
+
+def show_rendered_graph(rendered_graph):
+    # Displays a rendered graph, reporting any fallback
+    render_mode, digraph_source, svg, layout_kept, _ = rendered_graph
+    if not layout_kept:
+        st.info("Could not compute the layout on the server, so node positions were not kept.")
+    if render_mode is None:
+        st.warning("The graph could not be rendered within the timeout. Please select fewer clusters.")
+    else:
+        if render_mode != "full":
+            st.info(f"Showing a {render_mode_descriptions[render_mode]} to stay within the render budget.")
+        if svg is not None:
+            st.image(svg)
+        else:
+            st.graphviz_chart(digraph_source)
+
+# Background render worker for this session and the key of the render it is preparing
+if "render_worker" not in st.session_state:
+    st.session_state.render_worker = RenderWorker()
+if "render_pending_key" not in st.session_state:
+    st.session_state.render_pending_key = None
+
+# Key and message of the last background render that failed, so it is reported rather than retried
+if "render_error" not in st.session_state:
+    st.session_state.render_error = None
+
+@st.fragment(run_every=0.5)
+def wait_for_render():
+    # Polls the background render, rerunning the app once the latest render is ready
+    render_result = st.session_state.render_worker.get_result()
+    if render_result is not None and render_result[0] == st.session_state.render_pending_key:
+        st.session_state.render_pending_key = None
+        if render_result[2] is not None:
+            # Report the failure in the app instead of raising it, which would stop the whole page
+            st.session_state.render_error = (render_result[0], f"Could not render the graph: {render_result[2]}")
+        else:
+            st.session_state.derived_cache["render"] = (render_result[0], render_result[1])
+            st.session_state.render_metrics = render_result[1][4]
+        st.session_state.show_graph = True
+        st.rerun()
+    elif not st.session_state.render_worker.is_busy():
+        # The render was dropped by the worker, so ask for it again
+        st.session_state.render_pending_key = None
+        st.session_state.show_graph = True
+        st.rerun()
+    else:
+        st.caption("Rendering the graph in the background...")
+
+# Display the subgraph diagram if there are selected clusters, reusing the last render if nothing changed
+if len(st.session_state.graph.get_nodes(graph=render_graph)) > 0 and st.session_state.show_graph:
+    render_key = (st.session_state.graph.version, tuple(st.session_state.subgraph_cluster_ids), collapse_unselected,
+                  cluster_fillcolor, cluster_fontcolor, rank_fillcolor, rank_fontcolor,
+                  words_per_node, words_per_node_line, rankdir_lr, max_rank_nodes,
+                  keep_layout, render_timeout, node_budget, edge_budget)
+    render_kwargs = dict(graph=st.session_state.graph,
+                         digraph_kwargs=dict(graph=render_graph,
+                                             cluster_fillcolor=cluster_fillcolor,
+                                             cluster_fontcolor=cluster_fontcolor,
+                                             rank_fillcolor=rank_fillcolor,
+                                             rank_fontcolor=rank_fontcolor,
+                                             words_per_node=words_per_node, 
+                                             words_per_node_line=words_per_node_line,
+                                             rankdir_lr=rankdir_lr,
+                                             collapse_cluster_ids=collapse_cluster_ids,
+                                             max_rank_nodes=max_rank_nodes if max_rank_nodes > 0 else None),
+                         keep_layout=keep_layout,
+                         layout_key=(rankdir_lr, collapse_unselected, max_rank_nodes),
+                         render_timeout=render_timeout,
+                         node_budget=node_budget,
+                         edge_budget=edge_budget,
+                         graph_version=st.session_state.graph.version,
+                         text_versions=dict(st.session_state.graph.text_versions))
+
+    cached_render = st.session_state.derived_cache.get("render")
+    if st.session_state.render_error is not None and st.session_state.render_error[0] == render_key:
+        st.session_state.render_pending_key = None
+        st.error(st.session_state.render_error[1])
+    elif background_render and (cached_render is None or cached_render[0] != render_key):
+        # Render from a copy of the graph structure so later edits cannot change it mid-render
+        if render_graph is st.session_state.graph.graph:
+            render_kwargs["digraph_kwargs"]["graph"] = st.session_state.graph.copy_graph_structure()
+        st.session_state.render_worker.submit(render_key, functools.partial(get_rendered_graph, **render_kwargs))
+        st.session_state.render_pending_key = render_key
+    else:
+        st.session_state.render_pending_key = None
+        def render_graph_now():
+            # Renders in this rerun, counting the layout and render in its timings
+            rendered_graph = get_rendered_graph(**render_kwargs)
+            rerun_metrics.merge(rendered_graph[4])
+            return rendered_graph
+        show_rendered_graph(get_derived("render", render_key, render_graph_now))
     st.session_state.show_graph = False
 
+# Count the layout and render of a background render in the timings of the rerun that shows it first
+if st.session_state.get("render_metrics") is not None:
+    rerun_metrics.merge(st.session_state.render_metrics)
+    st.session_state.render_metrics = None
+
+# Show the last completed render until the new one is ready
+if st.session_state.render_pending_key is not None:
+    if "render" in st.session_state.derived_cache:
+        st.caption("Showing the previous render until the new one is ready.")
+        show_rendered_graph(st.session_state.derived_cache["render"][1])
+    wait_for_render()
+
 # Add under the subgraphs section
 st.markdown("---")
 
 # Make columns for subgraph JSON
 json_cols = st.columns(2)
 
-# Display the subgraph JSON
+# Display the subgraph JSON one section page at a time
 json_cols[0].markdown("## JSON")
-json_cols[0].json(subgraph, expanded=True)
+
+subgraph_sections = {"clusters": st.session_state.graph.get_clusters(graph=subgraph),
+                     "nodes": st.session_state.graph.get_nodes(graph=subgraph),
+                     "edges": st.session_state.graph.get_edges(graph=subgraph),
+                     "bundles": st.session_state.graph.get_bundles(graph=subgraph)}
+json_cols[0].markdown(" | ".join(f"**{len(section)}** {name}" for name, section in subgraph_sections.items()))
+
+json_section_cols = json_cols[0].columns(3)
+json_section = json_section_cols[0].radio("Section", list(subgraph_sections.keys()), key="json_section")
+json_page_size = json_section_cols[1].selectbox("Page Size", [10, 25, 50, 100], index=1, key="json_page_size")
+json_page_count = max(1, -(-len(subgraph_sections[json_section]) // json_page_size))
+json_page = json_section_cols[2].number_input(f"Page (of {json_page_count})", min_value=1, max_value=json_page_count, value=1, key="json_page")
+
+def get_json_summary(value, value_chars):
+    # Returns a short stand-in for a JSON value(value) of value_chars characters too large to show
+    summary = {"note": f"Too large to show ({value_chars} characters). Please use the download buttons."}
+    if isinstance(value, dict) and all(isinstance(x, list) for x in value.values()):
+        # Clusters are summarised by the number of nodes in each rank
+        summary["rank_node_counts"] = {rank_id: len(node_ids) for rank_id, node_ids in value.items()}
+    return summary
+
+# Only the selected page is copied and sent to the browser, cut short if it is too large
+json_max_chars = 200000
+json_page_items = {}
+json_page_chars = 0
+for key, value in itertools.islice(subgraph_sections[json_section].items(), (json_page - 1) * json_page_size, json_page * json_page_size):
+    value_chars = len(json.dumps(value))
+    if value_chars > json_max_chars:
+        value = get_json_summary(value, value_chars)
+        value_chars = len(json.dumps(value))
+    json_page_chars += value_chars
+    if json_page_chars > json_max_chars and len(json_page_items) > 0:
+        json_cols[0].info("This page was cut short because it is too large. Please use a smaller page size.")
+        break
+    json_page_items[key] = value
+json_cols[0].json(json_page_items, expanded=True)
 
 # Offer download buttons for the subgraph JSON and full graph JSON
 json_cols[1].markdown("## Download")
-json_cols[1].download_button("Download Subgraph JSON", json.dumps(subgraph), "subgraph.json")
-json_cols[1].download_button("Download Graph JSON", json.dumps(st.session_state.graph.graph), "graph.json")
+def get_graph_json(get_graph):
+    # Returns a function serialising the graph structure returned by a function(get_graph) to JSON
+    # Download buttons only call it when clicked, so the JSON is never kept in session state
+    return lambda: json.dumps(get_graph())
+
+json_cols[1].download_button("Download Subgraph JSON", get_graph_json(lambda: subgraph), "subgraph.json", 
+                             mime="application/json", on_click="ignore")
+json_cols[1].download_button("Download Graph JSON", get_graph_json(st.session_state.graph.export_graph), "graph.json", 
+                             mime="application/json", on_click="ignore")
+
+# Add under the JSON section
+st.markdown("---")
+
+# Show vectorised analytics of the whole graph
+st.markdown("## Analytics")
+
+def get_pair_rows(group_labels, edge_counts, max_pairs):
+    # Returns rows of the max_pairs group pairs with the most edges in a sparse edge count matrix(edge_counts),
+    # labelled with group labels(group_labels)
+    import numpy as np
+
+    top_pairs = np.argsort(-edge_counts.data, kind="stable")[:max_pairs]
+    return [{"from": group_labels[edge_counts.row[x]], "to": group_labels[edge_counts.col[x]], "edges": int(edge_counts.data[x])} 
+            for x in top_pairs]
+
+def get_analytics(graph):
+    # Returns node degree and PageRank rows and the labelled cluster-to-cluster and rank-to-rank sparse edge count matrices 
+    # of a Graph(graph)
+    with rerun_metrics.timer("analytics"):
+        node_ids, in_degrees, out_degrees = graph.get_node_degrees()
+        node_ids, pagerank_scores = graph.get_pagerank()
+        cluster_ids, cluster_edge_counts = graph.get_cluster_edge_counts()
+        rank_ids, rank_edge_counts = graph.get_rank_edge_counts()
+    rank_labels = [f"{cluster_id} / {rank_id}" for cluster_id, rank_id in rank_ids]
+
+    node_rows = [{"node": node_id, "in_degree": int(in_degree), "out_degree": int(out_degree), "pagerank": float(score)} 
+                 for node_id, in_degree, out_degree, score in zip(node_ids, in_degrees, out_degrees, pagerank_scores)]
+    return node_rows, (cluster_ids, cluster_edge_counts), (rank_labels, rank_edge_counts)
+
+if graph_has_nodes and st.checkbox("Show Analytics", value=False, key="show_analytics"):
+    try:
+        node_rows, cluster_edge_counts, rank_edge_counts = get_derived("analytics", st.session_state.graph.version, 
+                                                         lambda: get_analytics(st.session_state.graph))
+    except ImportError:
+        st.info("Please install numpy and scipy to show graph analytics.")
+    else:
+        analytics_cols = st.columns(2)
+        analytics_sort = analytics_cols[0].selectbox("Rank Nodes By", ["pagerank", "in_degree", "out_degree"], key="analytics_sort")
+        analytics_top = analytics_cols[1].number_input("Top Nodes", min_value=1, max_value=max(1, len(node_rows)), 
+                                                       value=min(10, len(node_rows)), key="analytics_top")
+        st.dataframe(sorted(node_rows, key=lambda x: -x[analytics_sort])[:analytics_top])
+
+        # Only the group pairs with the most edges are sent to the browser
+        analytics_pairs = st.number_input("Top Group Pairs", min_value=1, value=20, key="analytics_pairs")
+        st.markdown("#### Cluster-to-Cluster Edges")
+        st.dataframe(get_pair_rows(*cluster_edge_counts, analytics_pairs))
+        st.markdown("#### Rank-to-Rank Edges")
+        st.dataframe(get_pair_rows(*rank_edge_counts, analytics_pairs))
 
 # Add links to relevant web pages in sidebar 
 st.sidebar.markdown("## Links")
@@ -550,8 +960,16 @@ for name, url in url_dict.items():
     if i == len(url_cols):
         i = 0
     if name_url_col.button(name):
+        import webbrowser
         webbrowser.open_new_tab(url)
 
+# Show the timings of this rerun
+if show_timings:
+    rerun_metrics.record("rerun", time.perf_counter() - rerun_start)
+    with st.expander("Timings"):
+        st.dataframe([{"operation": name, **metric} for name, metric in rerun_metrics.to_dict().items()])
+        st.code(rerun_metrics.to_prometheus(), language="text")
+
 # Put app closer
 st.markdown("---")
 st.markdown("Copyright \u00A9 2023 Mitchell Isaac Parker")
@@ -0,0 +1,423 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+from graph import Graph
+from sqlite_graph import SQLiteGraph
+from store import load_graph_files
+
+
+# Synthetic graph shapes
+graph_shapes = ["clusters", "chain", "fanout", "cross"]
+
+# Graph storage backends: in-memory dictionaries or a SQLite database file
+graph_backends = ["memory", "sqlite"]
+
+# Directory holding the SQLite database files of the running benchmark
+database_dir = None
+
+# Default graph sizes (number of nodes)
+graph_scales = [1000, 10000, 100000]
+
+# Modules whose import time is measured, and the import time(seconds) each should stay under
+import_modules = ["graph", "sqlite_graph", "store", "render", "metrics"]
+import_time_budget = 0.1
+
+# Words used to generate node text
+text_words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa",
+              "lambda", "mu", "nu", "xi", "omicron", "pi", "rho", "sigma", "tau", "upsilon"]
+
+
+def make_graph(shape, n_nodes, seed=0):
+    # Returns clusters, nodes and edges of a seeded synthetic graph with n_nodes nodes
+    #   clusters: many clusters and ranks with edges to the next rank of the same cluster
+    #   chain: a few deep chains of nodes
+    #   fanout: hub nodes each connected to many other nodes
+    #   cross: edges between random nodes across clusters
+    rng = random.Random(seed)
+    clusters = {}
+    nodes = {}
+    edges = {}
+
+    n_clusters = max(1, n_nodes // 200) if shape != "chain" else 4
+    n_ranks = 5 if shape != "chain" else max(1, n_nodes // (4 * 50))
+
+    node_ids = [str(i) for i in range(n_nodes)]
+    for i, node_id in enumerate(node_ids):
+        if shape == "chain":
+            cluster_id = f"Cluster {i % n_clusters}"
+            rank_id = f"Rank {min(n_ranks - 1, (i // n_clusters) // 50)}"
+        else:
+            cluster_id = f"Cluster {rng.randrange(n_clusters)}"
+            rank_id = f"Rank {rng.randrange(n_ranks)}"
+        node_text = " ".join(rng.choice(text_words) for _ in range(rng.randint(1, 12)))
+        nodes[node_id] = {"cluster": cluster_id, "rank": rank_id, "text": node_text}
+        clusters.setdefault(cluster_id, {}).setdefault(rank_id, []).append(node_id)
+
+    if shape == "clusters":
+        for cluster_id, cluster_ranks in clusters.items():
+            rank_node_ids = [cluster_ranks[x] for x in sorted(cluster_ranks.keys())]
+            for from_rank_node_ids, to_rank_node_ids in zip(rank_node_ids, rank_node_ids[1:]):
+                for from_node_id in from_rank_node_ids:
+                    for to_node_id in rng.sample(to_rank_node_ids, min(2, len(to_rank_node_ids))):
+                        edges[f"{from_node_id}->{to_node_id}"] = {}
+    elif shape == "chain":
+        for i in range(n_nodes - n_clusters):
+            edges[f"{node_ids[i]}->{node_ids[i + n_clusters]}"] = {}
+    elif shape == "fanout":
+        for hub_node_id in rng.sample(node_ids, max(1, n_nodes // 100)):
+            for to_node_id in rng.sample(node_ids, min(n_nodes, 200)):
+                if to_node_id != hub_node_id:
+                    edges[f"{hub_node_id}->{to_node_id}"] = {}
+    elif shape == "cross":
+        for from_node_id in node_ids:
+            for to_node_id in rng.sample(node_ids, min(n_nodes, 2)):
+                edges[f"{from_node_id}->{to_node_id}"] = {}
+    else:
+        raise ValueError(f"Unknown graph shape: {shape}")
+
+    return clusters, nodes, edges
+
+
+def setup_graph(clusters, nodes, edges, backend="memory"):
+    # Returns a Graph built from copies of the generated structures, stored by a backend(backend)
+    if backend == "sqlite":
+        graph = SQLiteGraph(get_database_path())
+        graph.import_graph({"clusters": clusters, "nodes": nodes, "edges": edges})
+        return graph
+    return Graph(clusters=deepcopy(clusters), nodes=deepcopy(nodes), edges=deepcopy(edges))
+
+
+def get_database_path():
+    # Returns the path of a new, not yet created SQLite database file in the benchmark's temporary directory
+    fd, path = tempfile.mkstemp(suffix=".db", dir=database_dir)
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def bench_add_nodes(clusters, nodes, edges, backend="memory"):
+    # Adds 1% new nodes to existing clusters
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    cluster_ids = graph.get_cluster_ids()
+    new_nodes = [(f"new {i}", {"cluster": cluster_ids[i % len(cluster_ids)], "rank": "Rank 0", "text": "new node text"})
+                 for i in range(max(1, len(nodes) // 100))]
+    def run():
+        for node_id, node_attr in new_nodes:
+            graph.add_nodes(node_attr, node_ids=node_id)
+    return run
+
+
+def bench_remove_nodes(clusters, nodes, edges, backend="memory"):
+    # Removes 1% of the nodes and their edges
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    remove_node_ids = random.Random(1).sample(graph.get_node_ids(), max(1, len(nodes) // 100))
+    def run():
+        graph.remove_nodes(remove_node_ids)
+    return run
+
+
+def bench_connect_clusters(clusters, nodes, edges, backend="memory"):
+    # Connects every node of one cluster to every node of another, as the cluster-level edge panel does
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    cluster_ids = graph.get_cluster_ids()
+    from_node_ids = graph.get_cluster_node_ids(cluster_ids[0])
+    to_node_ids = graph.get_cluster_node_ids(cluster_ids[-1])
+    def run():
+        graph.add_edges(from_node_ids, to_node_ids, edge_attr={"color": "red"})
+    return run
+
+
+def bench_get_subgraph(clusters, nodes, edges, backend="memory"):
+    # Selects every cluster but one, as when viewing most of the graph
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    subgraph_node_ids = []
+    for cluster_id in graph.get_cluster_ids()[1:]:
+        subgraph_node_ids += graph.get_cluster_node_ids(cluster_id)
+    def run():
+        graph.get_subgraph(subgraph_node_ids)
+    return run
+
+
+def bench_cluster_subgraph(clusters, nodes, edges, backend="memory"):
+    # Loads the subgraph of two clusters, as when viewing a small part of the graph
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    cluster_ids = graph.get_cluster_ids()[:2]
+    def run():
+        if backend == "sqlite":
+            graph.get_cluster_subgraph(cluster_ids)
+        else:
+            graph.get_subgraph([x for cluster_id in cluster_ids for x in graph.get_cluster_node_ids(cluster_id)])
+    return run
+
+
+def write_graph_shards(clusters, nodes, edges, n_shards=8):
+    # Writes the graph as JSON files of shards of clusters, with each edge in the shard of its from node, and returns their paths
+    cluster_shards = {cluster_id: i % n_shards for i, cluster_id in enumerate(clusters.keys())}
+    shards = [{"clusters": {}, "nodes": {}, "edges": {}} for _ in range(n_shards)]
+    for cluster_id, cluster_ranks in clusters.items():
+        shards[cluster_shards[cluster_id]]["clusters"][cluster_id] = cluster_ranks
+    for node_id, node_attr in nodes.items():
+        shards[cluster_shards[node_attr["cluster"]]]["nodes"][node_id] = node_attr
+    for edge_id, edge_attr in edges.items():
+        shards[cluster_shards[nodes[edge_id.split("->")[0]]["cluster"]]]["edges"][edge_id] = edge_attr
+
+    paths = []
+    for i, shard in enumerate(shards):
+        fd, path = tempfile.mkstemp(suffix=".json", dir=database_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(shard, f)
+        paths.append(path)
+    return paths
+
+
+def load_graph_shards(paths, backend="memory", max_workers=None, min_parallel_bytes=None):
+    # Loads and merges graph JSON shards(paths), storing the merged graph by a backend(backend)
+    graph = load_graph_files(paths, max_workers=max_workers, min_parallel_bytes=min_parallel_bytes)
+    if backend == "sqlite":
+        SQLiteGraph(get_database_path()).import_graph(graph.graph)
+
+
+def bench_load_shards(clusters, nodes, edges, backend="memory"):
+    # Loads and merges 8 graph JSON shards, parsed in parallel worker processes once they are large enough
+    paths = write_graph_shards(clusters, nodes, edges)
+    def run():
+        load_graph_shards(paths, backend=backend)
+    return run
+
+
+def bench_load_shards_parallel(clusters, nodes, edges, backend="memory"):
+    # Loads and merges 8 graph JSON shards in parallel worker processes whatever their size, to compare with serial loading
+    # when setting min_parallel_shard_bytes
+    paths = write_graph_shards(clusters, nodes, edges)
+    def run():
+        load_graph_shards(paths, backend=backend, min_parallel_bytes=0)
+    return run
+
+
+def bench_load_shards_serial(clusters, nodes, edges, backend="memory"):
+    # Loads and merges 8 graph JSON shards parsed one after another
+    paths = write_graph_shards(clusters, nodes, edges)
+    def run():
+        load_graph_shards(paths, backend=backend, max_workers=1)
+    return run
+
+
+def bench_build_digraph(clusters, nodes, edges, backend="memory"):
+    # Builds the compact DOT source of the whole graph
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    def run():
+        return graph.build_digraph().source
+    return run
+
+
+def bench_build_digraph_verbose(clusters, nodes, edges, backend="memory"):
+    # Builds the DOT source of the whole graph with every attribute written on every node and edge
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    def run():
+        return graph.build_digraph(compact=False).source
+    return run
+
+
+def bench_edge_adjacency(clusters, nodes, edges, backend="memory"):
+    # Builds the edge adjacency list
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    def run():
+        graph.get_edge_adjacency()
+    return run
+
+
+def bench_breadth_first(clusters, nodes, edges, backend="memory"):
+    # Sorts nodes with breadth-first search
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    edge_adjacency = graph.get_edge_adjacency()
+    def run():
+        graph.get_sorted_nodes(breadth_search=True, edge_adjacency=edge_adjacency)
+    return run
+
+
+def bench_depth_first(clusters, nodes, edges, backend="memory"):
+    # Sorts nodes with depth-first search
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    edge_adjacency = graph.get_edge_adjacency()
+    def run():
+        graph.get_sorted_nodes(breadth_search=False, edge_adjacency=edge_adjacency)
+    return run
+
+
+def bench_search_nodes(clusters, nodes, edges, backend="memory"):
+    # Runs prefix and multi-term text searches
+    graph = setup_graph(clusters, nodes, edges, backend=backend)
+    def run():
+        for query in ["al", "beta", "gam del", "sigma tau upsilon"]:
+            graph.search_nodes(query)
+    return run
+
+
+# Benchmarked operations (name -> function returning the timed callable)
+benchmarks = {"add_nodes": bench_add_nodes,
+              "remove_nodes": bench_remove_nodes,
+              "connect_clusters": bench_connect_clusters,
+              "get_subgraph": bench_get_subgraph,
+              "cluster_subgraph": bench_cluster_subgraph,
+              "build_digraph": bench_build_digraph,
+              "build_digraph_verbose": bench_build_digraph_verbose,
+              "edge_adjacency": bench_edge_adjacency,
+              "breadth_first": bench_breadth_first,
+              "depth_first": bench_depth_first,
+              "search_nodes": bench_search_nodes,
+              "load_shards": bench_load_shards,
+              "load_shards_parallel": bench_load_shards_parallel,
+              "load_shards_serial": bench_load_shards_serial}
+
+
+def measure(bench_name, shape, n_nodes, repeat, queue, backend="memory"):
+    # Measures the best time(seconds) over repeat runs and peak traced memory(bytes) of one benchmark,
+    # and the size(bytes) of its output when it returns text such as DOT source
+    global database_dir
+    try:
+        clusters, nodes, edges = make_graph(shape, n_nodes)
+
+        with tempfile.TemporaryDirectory() as database_dir:
+            times = []
+            for _ in range(repeat):
+                run = benchmarks[bench_name](clusters, nodes, edges, backend=backend)
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+
+            run = benchmarks[bench_name](clusters, nodes, edges, backend=backend)
+            tracemalloc.start()
+            output = run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        result = {"time": min(times), "peak_memory": peak_memory}
+        if isinstance(output, str):
+            result["output_bytes"] = len(output.encode("utf-8"))
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmark(bench_name, shape, n_nodes, repeat=3, timeout=60, backend="memory"):
+    # Runs one benchmark in a worker process so slow or crashing operations cannot stall the suite
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(bench_name, shape, n_nodes, repeat, queue, backend))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {"error": f"Timeout after {timeout} s"}
+    if queue.empty():
+        return {"error": f"Exit code {process.exitcode}"}
+    return queue.get()
+
+
+def measure_import_time(module, repeat=3):
+    # Measures the best cumulative import time(seconds) of a module(module) in a fresh interpreter with python -X importtime
+    times = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], 
+                                 capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if process.returncode != 0:
+            return {"error": process.stderr.strip().splitlines()[-1]}
+
+        # Lines read "import time: self [us] | cumulative [us] | module", the top-level module last
+        for line in process.stderr.splitlines():
+            fields = [x.strip() for x in line.split("|")]
+            if len(fields) == 3 and fields[2] == module:
+                times.append(int(fields[1]) / 1e6)
+
+    if len(times) == 0:
+        return {"error": f"No import time reported for {module}"}
+    return {"time": min(times)}
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    # Returns lines comparing results with a baseline, flagging changes beyond a tolerance(tolerance)
+    lines = []
+    for key, result in results.items():
+        if key not in baseline or "error" in result or "error" in baseline[key]:
+            continue
+        for metric in ["time", "peak_memory", "output_bytes"]:
+            if metric not in result or metric not in baseline[key] or baseline[key][metric] == 0:
+                continue
+            ratio = result[metric] / baseline[key][metric]
+            status = ""
+            if ratio > 1 + tolerance:
+                status = "REGRESSION"
+            elif ratio < 1 - tolerance:
+                status = "improvement"
+            lines.append(f"{key:<40} {metric:<12} {ratio:>7.2f}x {status}")
+    return lines
+
+
+def format_result(key, result):
+    # Returns one line of the results table
+    if "error" in result:
+        return f"{key:<40} {result['error']}"
+    line = f"{key:<40} {result['time']:>10.4f} s"
+    if "peak_memory" in result:
+        line += f" {result['peak_memory'] / 1e6:>10.2f} MB"
+    if "output_bytes" in result:
+        line += f" {result['output_bytes'] / 1e6:>10.2f} MB output"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Graph operations on synthetic graphs.")
+    parser.add_argument("--shapes", nargs="+", default=graph_shapes, choices=graph_shapes)
+    parser.add_argument("--scales", nargs="+", type=int, default=graph_scales[:2])
+    parser.add_argument("--backends", nargs="+", default=graph_backends[:1], choices=graph_backends)
+    parser.add_argument("--benchmarks", nargs="+", default=list(benchmarks.keys()), choices=list(benchmarks.keys()))
+    parser.add_argument("--imports", nargs="*", default=import_modules, choices=import_modules, 
+                        help="Modules to time the import of (none to skip)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds allowed per benchmark")
+    parser.add_argument("--save", help="Write results to a JSON baseline file")
+    parser.add_argument("--compare", help="Compare results with a JSON baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.imports:
+        key = f"import/{module}"
+        results[key] = measure_import_time(module, repeat=args.repeat)
+        line = format_result(key, results[key])
+        if results[key].get("time", 0) > import_time_budget:
+            line += f" (over the {import_time_budget * 1000:.0f} ms budget)"
+        print(line, flush=True)
+
+    for shape in args.shapes:
+        for n_nodes in args.scales:
+            for bench_name in args.benchmarks:
+                for backend in args.backends:
+                    # Keys of the default backend stay unprefixed so older baselines still compare
+                    key = f"{shape}/{n_nodes}/{bench_name}"
+                    if backend != graph_backends[0]:
+                        key = f"{backend}:{key}"
+                    results[key] = run_benchmark(bench_name, shape, n_nodes, repeat=args.repeat, timeout=args.timeout, backend=backend)
+                    print(format_result(key, results[key]), flush=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        print("\n".join(compare_results(results, baseline, tolerance=args.tolerance)))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,24 @@
-from graphviz import Digraph
 from copy import deepcopy
 from collections import defaultdict, deque
 import itertools
 import random
+import bisect
+import heapq
+import math
+import re
+import threading
+
+# Graph versions are drawn from one counter so a version identifies the state of one graph within the process
+graph_versions = itertools.count(1)
 
 class Graph():
-    def __init__(self, clusters={}, nodes={}, edges={}):
+    def __init__(self, clusters=None, nodes=None, edges=None, bundles=None):
         # Constants
         self.id_key = "id"
         self.clusters_key = "clusters"
         self.nodes_key = "nodes"
         self.edges_key = "edges"
+        self.bundles_key = "bundles"
         self.cluster_attr = "cluster"
         self.rank_attr = "rank"
         self.text_attr = "text"
@@ -21,9 +29,47 @@ class Graph():
         self.label_attr = "label"
         self.color_attr = "color"
         self.edge_sep = "->"
-
-        # Graph structure
-        self.graph = {self.clusters_key: clusters, self.nodes_key: nodes, self.edges_key: edges}
+        self.aggregate_prefix = "__aggregate__"
+        self.aggregate_sep = "__"
+        self.bundle_from_key = "from"
+        self.bundle_to_key = "to"
+        self.bundle_attr_key = "attr"
+        self.edge_chunk_size = 10000
+        self.shard_sep = "@"
+        self.node_conflicts = ["first", "last", "merge", "rename", "error"]
+
+        # Graph structure (new dictionaries per graph so instances never share state)
+        if clusters is None:
+            clusters = {}
+        if nodes is None:
+            nodes = {}
+        if edges is None:
+            edges = {}
+        if bundles is None:
+            bundles = {}
+        self.graph = {self.clusters_key: clusters, self.nodes_key: nodes, self.edges_key: edges, self.bundles_key: bundles}
+
+        # Inverted index over node text (token -> {node ID: token count}) and its sorted tokens
+        self.text_index = {}
+        self.text_index_tokens = []
+        self.build_text_index()
+
+        # Graph version used to invalidate derived results, renewed on every edit
+        self.version = next(graph_versions)
+
+        # Node text versions (node ID -> edit count) and cached node labels (node ID -> (label key, label))
+        self.text_versions = {}
+        self.label_cache = {}
+
+        # Node positions from past layouts ((graph version, layout key) -> {node ID: (text version, position)})
+        self.layout_cache = {}
+        self.layout_cache_size = 5
+
+        # Lock over the label and layout caches, which background renders fill while the app reads and evicts them
+        self.cache_lock = threading.Lock()
+
+        # Sparse adjacency matrix of the latest graph version (graph version, to_csr result)
+        self.csr_cache = None
 
     def get_clusters(self, graph=None):
         # Returns dictionary of clusters
@@ -43,6 +89,13 @@ class Graph():
             graph = self.graph
         return graph[self.edges_key]
     
+    def get_bundles(self, graph=None):
+        # Returns bundle edges (bundle ID -> from and to (cluster ID, rank ID) and edge attributes)
+        # Graph structures without bundle edges have none
+        if graph is None:
+            graph = self.graph
+        return graph.get(self.bundles_key, {})
+
     def get_cluster_by_id(self, cluster_id, graph=None):
         # Returns cluster by ID(cluster_id)
         return self.get_clusters(graph=graph)[cluster_id]
@@ -72,6 +125,22 @@ class Graph():
         # Returns the value of the attribute(attr_key) for the edge with ID(from_node_id) and ID(to_node_id)
         return self.get_edge_by_id(from_node_id, to_node_id, graph=graph)[attr_key]
     
+    def is_node_id(self, node_id, graph=None):
+        # Returns boolean indicating if a node with ID(node_id) is in the graph
+        return node_id in self.get_nodes(graph=graph)
+
+    def is_cluster_id(self, cluster_id, graph=None):
+        # Returns boolean indicating if a cluster with ID(cluster_id) is in the graph
+        return cluster_id in self.get_clusters(graph=graph)
+
+    def is_cluster_rank_id(self, cluster_id, rank_id, graph=None):
+        # Returns boolean indicating if the cluster with ID(cluster_id) has a rank with ID(rank_id)
+        return self.is_cluster_id(cluster_id, graph=graph) and rank_id in self.get_cluster_by_id(cluster_id, graph=graph)
+
+    def is_cluster_rank_node_id(self, cluster_id, rank_id, node_id, graph=None):
+        # Returns boolean indicating if the node with ID(node_id) is listed in a rank(rank_id) of a cluster(cluster_id)
+        return node_id in self.get_cluster_rank_node_ids(cluster_id, rank_id, graph=graph)
+
     def get_cluster_ids(self, graph=None):
         # Returns list of clusters
         return list(self.get_clusters(graph=graph).keys())
@@ -125,6 +194,10 @@ class Graph():
         if graph is None:
             graph = self.graph
 
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
         # Make node IDs(node_ids) a list if it is not already
         if type(node_ids) != list:
             node_ids = list([node_ids])
@@ -135,22 +208,27 @@ class Graph():
             ### Generate random node ID(add_node_id) if none are provided
             if add_node_id == None:
                 add_node_id = str(0)
-                while add_node_id in self.get_node_ids(graph=graph):
-                    add_node_id = str(random.randint(0, len(self.get_node_ids(graph=graph))+1))
+                while self.is_node_id(add_node_id, graph=graph):
+                    add_node_id = str(random.randint(0, len(self.get_nodes(graph=graph))+1))
 
             # Adds a node with ID(add_node_id) and attributes(node_attr) to the graph
+            if graph is self.graph and add_node_id in graph[self.nodes_key]:
+                self.unindex_node_text(add_node_id)
             graph[self.nodes_key][add_node_id] = node_attr
+            if graph is self.graph:
+                self.index_node_text(add_node_id)
+                self.update_text_version(add_node_id)
 
             cluster_id = self.get_node_attr(add_node_id, self.cluster_attr, graph=graph)
             rank_id = self.get_node_attr(add_node_id, self.rank_attr, graph=graph)
 
             # Add node to the corresponding cluster and rank
-            if cluster_id not in self.get_cluster_ids(graph=graph):
+            if not self.is_cluster_id(cluster_id, graph=graph):
                 graph[self.clusters_key][cluster_id] = {}
-            if rank_id not in self.get_cluster_rank_ids(cluster_id, graph=graph):
+            if not self.is_cluster_rank_id(cluster_id, rank_id, graph=graph):
                 graph[self.clusters_key][cluster_id][rank_id] = []
 
-            if add_node_id not in self.get_cluster_rank_node_ids(cluster_id, rank_id, graph=graph):
+            if not self.is_cluster_rank_node_id(cluster_id, rank_id, add_node_id, graph=graph):
                 graph[self.clusters_key][cluster_id][rank_id] += [add_node_id]
 
         if graph is not None:
@@ -161,6 +239,10 @@ class Graph():
         if graph is None:
             graph = self.graph
 
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
         # Make node IDs(node_ids) a list if it is not already
         if type(node_ids) != list:
             node_ids = list([node_ids])
@@ -172,7 +254,10 @@ class Graph():
             cluster_id = self.get_node_attr(remove_node_id, self.cluster_attr, graph=graph)
             rank_id = self.get_node_attr(remove_node_id, self.rank_attr, graph=graph)
 
-            if remove_node_id in self.get_node_ids(graph=graph):
+            if self.is_node_id(remove_node_id, graph=graph):
+                if graph is self.graph:
+                    self.unindex_node_text(remove_node_id)
+                    self.update_text_version(remove_node_id)
                 del graph[self.nodes_key][remove_node_id]
 
                 # Remove node from its corresponding cluster and rank
@@ -181,6 +266,7 @@ class Graph():
                     del graph[self.clusters_key][cluster_id][rank_id]
                     if len(self.get_cluster_rank_ids(cluster_id, graph=graph)) == 0:
                         del graph[self.clusters_key][cluster_id]
+                    self.update_bundle_ends(lambda x: x, graph=graph)
 
                 # Remove edges connected to the node
                 if not edit_mode:
@@ -193,10 +279,6 @@ class Graph():
             return graph
 
     def add_edges(self, from_node_ids, to_node_ids, edge_attr={}, graph=None):
-        # Specify graph is it is not given
-        if graph is None:
-            graph = self.graph
-
         # Make from node IDs(from_node_ids) and to node IDs(to_node_ids) lists if they are not already
         if type(from_node_ids) != list:
             from_node_ids = list([from_node_ids])
@@ -204,8 +286,46 @@ class Graph():
             to_node_ids = list([to_node_ids])
 
         # Adds an edge between nodes with IDs(from_node_id) and IDs(to_node_id)
-        for add_from_node_id, add_to_node_id in self.get_node_product(from_node_ids, to_node_ids, graph=graph):
-            graph[self.edges_key][self.join_edge_id(add_from_node_id, add_to_node_id)] = edge_attr
+        return self.add_edges_bulk(from_node_ids, to_node_ids, edge_attr=edge_attr, graph=graph)
+
+    def add_edges_bulk(self, from_node_ids, to_node_ids, edge_attr=None, chunk_size=None, graph=None):
+        # Adds edges from every node with IDs(from_node_ids) to every node with IDs(to_node_ids), 
+        # consuming the node product in chunks of chunk_size edges instead of building it whole
+        # All added edges share one attribute record, copied when one of them is edited (see set_edge_attr)
+        if graph is None:
+            graph = self.graph
+
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        if chunk_size is None:
+            chunk_size = self.edge_chunk_size
+
+        shared_edge_attr = dict(edge_attr) if edge_attr is not None else {}
+        node_product = itertools.product(from_node_ids, to_node_ids)
+        while True:
+            edge_chunk = {self.join_edge_id(from_node_id, to_node_id): shared_edge_attr 
+                          for from_node_id, to_node_id in itertools.islice(node_product, chunk_size)}
+            if len(edge_chunk) == 0:
+                break
+            graph[self.edges_key].update(edge_chunk)
+
+        if graph is not None:
+            return graph
+
+    def set_edge_attr(self, from_node_id, to_node_id, attr_key, attr_val, graph=None):
+        # Sets an attribute(attr_key) of the edge between nodes with IDs(from_node_id) and ID(to_node_id)
+        # on a copy of its attribute record, so edges sharing the record are left unchanged
+        if graph is None:
+            graph = self.graph
+
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        edge_id = self.join_edge_id(from_node_id, to_node_id)
+        graph[self.edges_key][edge_id] = {**graph[self.edges_key][edge_id], attr_key: attr_val}
 
         if graph is not None:
             return graph
@@ -215,6 +335,10 @@ class Graph():
         if graph is None:
             graph = self.graph
 
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
         # Make from node IDs(from_node_ids) and to node IDs(to_node_ids) lists if they are not already
         if type(from_node_ids) != list:
             from_node_ids = list([from_node_ids])
@@ -222,21 +346,115 @@ class Graph():
             to_node_ids = list([to_node_ids])
 
         # Removes an edge between nodes with IDs(from_node_id) and IDs(to_node_id)
-        for remove_from_node_id, remove_to_node_id in self.get_node_product(from_node_ids, to_node_ids, graph=graph):
-            if self.join_edge_id(remove_from_node_id, remove_to_node_id) in self.get_edge_ids(graph=graph):
+        for remove_from_node_id, remove_to_node_id in itertools.product(from_node_ids, to_node_ids):
+            if self.join_edge_id(remove_from_node_id, remove_to_node_id) in graph[self.edges_key]:
                 del graph[self.edges_key][self.join_edge_id(remove_from_node_id, remove_to_node_id)]
 
         if graph is not None:
             return graph
+
+    def join_bundle_id(self, from_cluster_id, from_rank_id, to_cluster_id, to_rank_id):
+        # Returns the ID of the bundle edge from a cluster or rank to a cluster or rank
+        return self.join_edge_id(self.get_aggregate_id(from_cluster_id, from_rank_id), self.get_aggregate_id(to_cluster_id, to_rank_id))
+
+    def is_bundle_end(self, bundle_end, graph=None):
+        # Returns boolean indicating if the cluster or rank at an end(cluster ID, rank ID) of a bundle edge exists
+        cluster_id, rank_id = bundle_end
+        if cluster_id not in self.get_clusters(graph=graph):
+            return False
+        return rank_id is None or rank_id in self.get_cluster_by_id(cluster_id, graph=graph)
+
+    def get_bundle_end_node_ids(self, bundle_end, graph=None):
+        # Returns list of node IDs in the cluster or rank at an end(cluster ID, rank ID) of a bundle edge
+        cluster_id, rank_id = bundle_end
+        if not self.is_bundle_end(bundle_end, graph=graph):
+            return []
+        if rank_id is None:
+            return self.get_cluster_node_ids(cluster_id, graph=graph)
+        return self.get_cluster_rank_node_ids(cluster_id, rank_id, graph=graph)
+
+    def add_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, edge_attr=None, graph=None):
+        # Adds a bundle edge standing for edges from every node of a cluster or rank(from_cluster_id, from_rank_id)
+        # to every node of a cluster or rank(to_cluster_id, to_rank_id), without adding the edges themselves
+        if graph is None:
+            graph = self.graph
+
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        if self.bundles_key not in graph:
+            graph[self.bundles_key] = {}
+        graph[self.bundles_key][self.join_bundle_id(from_cluster_id, from_rank_id, to_cluster_id, to_rank_id)] = {
+            self.bundle_from_key: [from_cluster_id, from_rank_id],
+            self.bundle_to_key: [to_cluster_id, to_rank_id],
+            self.bundle_attr_key: dict(edge_attr) if edge_attr is not None else {}}
+
+        if graph is not None:
+            return graph
+
+    def remove_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, graph=None):
+        # Removes the bundle edge from a cluster or rank(from_cluster_id, from_rank_id) to a cluster or rank(to_cluster_id, to_rank_id)
+        if graph is None:
+            graph = self.graph
+
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        self.get_bundles(graph=graph).pop(self.join_bundle_id(from_cluster_id, from_rank_id, to_cluster_id, to_rank_id), None)
+
+        if graph is not None:
+            return graph
+
+    def expand_bundles(self, bundle_ids=None, graph=None):
+        # Replaces bundle edges with IDs(bundle_ids), or all bundle edges, by the edges they stand for
+        if graph is None:
+            graph = self.graph
+
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        bundles = self.get_bundles(graph=graph)
+        if bundle_ids is None:
+            bundle_ids = list(bundles.keys())
+
+        for bundle_id in bundle_ids:
+            bundle = bundles.pop(bundle_id)
+            graph = self.add_edges_bulk(self.get_bundle_end_node_ids(bundle[self.bundle_from_key], graph=graph),
+                                        self.get_bundle_end_node_ids(bundle[self.bundle_to_key], graph=graph),
+                                        edge_attr=bundle[self.bundle_attr_key], graph=graph)
+
+        if graph is not None:
+            return graph
+
+    def update_bundle_ends(self, update_end, graph=None):
+        # Renames the ends of bundle edges with a function(update_end) of each end(cluster ID, rank ID)
+        # and drops bundle edges whose clusters or ranks no longer exist
+        bundles = self.get_bundles(graph=graph)
+        for bundle_id, bundle in list(bundles.items()):
+            from_end = update_end(tuple(bundle[self.bundle_from_key]))
+            to_end = update_end(tuple(bundle[self.bundle_to_key]))
+            new_bundle_id = self.join_bundle_id(*from_end, *to_end)
+            if new_bundle_id != bundle_id:
+                del bundles[bundle_id]
+                bundles[new_bundle_id] = {**bundle, self.bundle_from_key: list(from_end), self.bundle_to_key: list(to_end)}
+            if not (self.is_bundle_end(from_end, graph=graph) and self.is_bundle_end(to_end, graph=graph)):
+                del bundles[new_bundle_id]
     
     def rename_cluster_rank_id(self, old_cluster_id, old_rank_id, new_cluster_id, new_rank_id, graph=None):
         # Edit rank IDs(from_cluster_id, from_rank_id) to IDs(to_cluster_id, to_rank_id)
         if graph is None:
             graph = self.graph
 
-        if new_cluster_id not in self.get_cluster_ids(graph=graph):
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        if not self.is_cluster_id(new_cluster_id, graph=graph):
             graph[self.clusters_key][new_cluster_id] = {}
-        if new_rank_id not in self.get_cluster_rank_ids(new_cluster_id, graph=graph):
+        if not self.is_cluster_rank_id(new_cluster_id, new_rank_id, graph=graph):
             graph[self.clusters_key][new_cluster_id][new_rank_id] = []
 
         graph[self.clusters_key][new_cluster_id][new_rank_id] += graph[self.clusters_key][old_cluster_id][old_rank_id]
@@ -249,6 +467,8 @@ class Graph():
             graph[self.nodes_key][node_id][self.cluster_attr] = new_cluster_id
             graph[self.nodes_key][node_id][self.rank_attr] = new_rank_id
 
+        self.update_bundle_ends(lambda x: (new_cluster_id, new_rank_id) if x == (old_cluster_id, old_rank_id) else x, graph=graph)
+
         if graph is not None:
             return graph
     
@@ -257,7 +477,11 @@ class Graph():
         if graph is None:
             graph = self.graph
 
-        if new_cluster_id not in self.get_cluster_ids(graph=graph):
+        # Mark the graph as changed
+        if graph is self.graph:
+            self.version = next(graph_versions)
+
+        if not self.is_cluster_id(new_cluster_id, graph=graph):
             graph[self.clusters_key][new_cluster_id] = {}
 
         graph[self.clusters_key][new_cluster_id].update(graph[self.clusters_key][old_cluster_id])
@@ -266,6 +490,8 @@ class Graph():
         for node_id in self.get_cluster_node_ids(new_cluster_id, graph=graph):
             graph[self.nodes_key][node_id][self.cluster_attr] = new_cluster_id
 
+        self.update_bundle_ends(lambda x: (new_cluster_id, x[1]) if x[0] == old_cluster_id else x, graph=graph)
+
         if graph is not None:
             return graph
         
@@ -285,6 +511,192 @@ class Graph():
 
         return subgraph
         
+    @staticmethod
+    def merge(*graphs, node_conflict="last", index_text=True):
+        # Returns a new Graph combining graphs(graphs), given as Graph objects or graph structures, 
+        # with its text index built once over the combined nodes unless index_text is False, e.g. for a partial merge
+        # Node IDs found in several graphs with different attributes are resolved by a rule(node_conflict):
+        #   first/last: keep the attributes from the first/last graph with the node
+        #   merge: combine the attributes, later graphs overriding earlier ones
+        #   rename: give the node of each later graph a new ID (node ID@graph number) and move its edges
+        #   error: raise a ValueError
+        # Nodes are placed in the cluster and rank of their final attributes, and later edges and bundle edges
+        # replace earlier ones with the same ID
+        merged = Graph()
+        if node_conflict not in merged.node_conflicts:
+            raise ValueError(f"Unknown node conflict rule: {node_conflict}")
+
+        graphs = [x.graph if isinstance(x, Graph) else x for x in graphs]
+        merged_clusters = merged.get_clusters()
+        merged_nodes = merged.get_nodes()
+        merged_edges = merged.get_edges()
+        merged_bundles = merged.get_bundles()
+
+        # Merge nodes, edges and bundle edges, renaming clashing nodes per graph if asked to
+        graph_node_renames = []
+        for i, graph in enumerate(graphs):
+            node_renames = {}
+            for node_id, node_attr in merged.get_nodes(graph=graph).items():
+                node_attr = dict(node_attr)
+                if node_id not in merged_nodes or merged_nodes[node_id] == node_attr or node_conflict == "last":
+                    merged_nodes[node_id] = node_attr
+                elif node_conflict == "merge":
+                    merged_nodes[node_id] = {**merged_nodes[node_id], **node_attr}
+                elif node_conflict == "rename":
+                    new_node_id = f"{node_id}{merged.shard_sep}{i}"
+                    while new_node_id in merged_nodes:
+                        new_node_id += merged.shard_sep
+                    node_renames[node_id] = new_node_id
+                    merged_nodes[new_node_id] = node_attr
+                elif node_conflict == "error":
+                    raise ValueError(f"Node {node_id} has different attributes in graph {i}")
+            graph_node_renames.append(node_renames)
+
+            for edge_id, edge_attr in merged.get_edges(graph=graph).items():
+                if len(node_renames) > 0:
+                    from_node_id, to_node_id = merged.split_edge_id(edge_id)
+                    edge_id = merged.join_edge_id(node_renames.get(from_node_id, from_node_id), node_renames.get(to_node_id, to_node_id))
+                merged_edges[edge_id] = edge_attr
+            merged_bundles.update(merged.get_bundles(graph=graph))
+
+        # Place each node once, in the order the graphs list their clusters, ranks and nodes
+        placed_node_ids = set()
+        for graph, node_renames in zip(graphs, graph_node_renames):
+            for cluster_id, cluster_ranks in merged.get_clusters(graph=graph).items():
+                for rank_id, rank_node_ids in cluster_ranks.items():
+                    for node_id in rank_node_ids:
+                        node_id = node_renames.get(node_id, node_id)
+                        if node_id in placed_node_ids or node_id not in merged_nodes:
+                            continue
+                        placed_node_ids.add(node_id)
+                        node_attr = merged_nodes[node_id]
+                        merged_clusters.setdefault(node_attr.get(merged.cluster_attr, cluster_id), {}).setdefault(
+                            node_attr.get(merged.rank_attr, rank_id), []).append(node_id)
+
+        # Place nodes missing from the cluster lists by their attributes
+        for node_id, node_attr in merged_nodes.items():
+            if node_id not in placed_node_ids and merged.cluster_attr in node_attr and merged.rank_attr in node_attr:
+                merged_clusters.setdefault(node_attr[merged.cluster_attr], {}).setdefault(node_attr[merged.rank_attr], []).append(node_id)
+
+        if index_text:
+            merged.build_text_index()
+        merged.version = next(graph_versions)
+        return merged
+
+    def tokenize_text(self, text):
+        # Returns the lowercase word tokens of a text string
+        return re.findall(r"\w+", str(text).lower())
+
+    def build_text_index(self):
+        # Builds the inverted index over the text of every node in the graph
+        self.text_index = {}
+        self.text_index_tokens = []
+        for node_id in self.get_node_ids():
+            self.index_node_text(node_id)
+
+    def index_node_text(self, node_id):
+        # Adds the text of the node with ID(node_id) to the inverted index
+        node_text = self.get_node_by_id(node_id).get(self.text_attr, "")
+        for token in self.tokenize_text(node_text):
+            if token not in self.text_index:
+                self.text_index[token] = {}
+                bisect.insort(self.text_index_tokens, token)
+            self.text_index[token][node_id] = self.text_index[token].get(node_id, 0) + 1
+
+    def unindex_node_text(self, node_id):
+        # Removes the text of the node with ID(node_id) from the inverted index
+        node_text = self.get_node_by_id(node_id).get(self.text_attr, "")
+        for token in set(self.tokenize_text(node_text)):
+            token_node_ids = self.text_index.get(token, {})
+            token_node_ids.pop(node_id, None)
+            if token in self.text_index and len(token_node_ids) == 0:
+                del self.text_index[token]
+                del self.text_index_tokens[bisect.bisect_left(self.text_index_tokens, token)]
+
+    def get_prefix_tokens(self, prefix):
+        # Returns indexed tokens starting with a prefix(prefix)
+        prefix_tokens = []
+        for i in range(bisect.bisect_left(self.text_index_tokens, prefix), len(self.text_index_tokens)):
+            if not self.text_index_tokens[i].startswith(prefix):
+                break
+            prefix_tokens.append(self.text_index_tokens[i])
+        return prefix_tokens
+
+    def get_term_scores(self, term, prefix_search=True):
+        # Returns node ID -> number of tokens in the node text matching a search term(term), or starting with it with prefix_search
+        term_tokens = self.get_prefix_tokens(term) if prefix_search else [term]
+        term_scores = {}
+        for token in term_tokens:
+            for node_id, count in self.text_index.get(token, {}).items():
+                term_scores[node_id] = term_scores.get(node_id, 0) + count
+        return term_scores
+
+    def search_nodes(self, query, max_results=10, prefix_search=True):
+        # Returns IDs of the top nodes whose text matches every term of a query(query)
+        scores = None
+        for term in self.tokenize_text(query):
+            term_scores = self.get_term_scores(term, prefix_search=prefix_search)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {node_id: score + term_scores[node_id] for node_id, score in scores.items() if node_id in term_scores}
+            if len(scores) == 0:
+                break
+
+        if scores is None:
+            scores = {}
+
+        node_ids = [node_id for node_id, _ in heapq.nsmallest(max_results, scores.items(), key=lambda x: (-x[1], x[0]))]
+
+        # Exact node ID matches always come first
+        query = str(query).strip()
+        if self.is_node_id(query):
+            node_ids = [query] + [x for x in node_ids if x != query][:max_results-1]
+
+        return node_ids
+
+    def export_graph(self):
+        # Returns the whole graph as a structure of plain dictionaries, e.g. for JSON export
+        return self.graph
+
+    def copy_graph_structure(self, graph=None):
+        # Returns a copy of the clusters, nodes and edges dictionaries that shares node and edge attributes,
+        # so the copy can be read while the graph itself is edited
+        if graph is None:
+            graph = self.graph
+
+        return {self.clusters_key: {cluster_id: {rank_id: list(rank_node_ids) for rank_id, rank_node_ids in cluster_ranks.items()} 
+                                    for cluster_id, cluster_ranks in self.get_clusters(graph=graph).items()},
+                self.nodes_key: dict(self.get_nodes(graph=graph)),
+                self.edges_key: dict(self.get_edges(graph=graph)),
+                self.bundles_key: dict(self.get_bundles(graph=graph))}
+
+    def get_sampled_subgraph(self, max_nodes, seed=0, graph=None):
+        # Returns a subgraph of at most max_nodes randomly chosen nodes and the edges between them
+        if graph is None:
+            graph = self.graph
+
+        sample_node_ids = self.get_node_ids(graph=graph)
+        if len(sample_node_ids) > max_nodes:
+            sample_node_ids = random.Random(seed).sample(sample_node_ids, max_nodes)
+        sample_node_ids = set(sample_node_ids)
+
+        subgraph = {self.clusters_key: {}, self.nodes_key: {}, self.edges_key: {}}
+        for cluster_id, cluster_ranks in self.get_clusters(graph=graph).items():
+            for rank_id, rank_node_ids in cluster_ranks.items():
+                rank_sample_node_ids = [x for x in rank_node_ids if x in sample_node_ids]
+                if len(rank_sample_node_ids) > 0:
+                    subgraph[self.clusters_key].setdefault(cluster_id, {})[rank_id] = rank_sample_node_ids
+                    for node_id in rank_sample_node_ids:
+                        subgraph[self.nodes_key][node_id] = deepcopy(self.get_node_by_id(node_id, graph=graph))
+
+        for edge_id, edge_attr in self.get_edges(graph=graph).items():
+            from_node_id, to_node_id = self.split_edge_id(edge_id)
+            if from_node_id in sample_node_ids and to_node_id in sample_node_ids:
+                subgraph[self.edges_key][edge_id] = deepcopy(edge_attr)
+
+        return subgraph
+        
     def prep_text(self, text, words_per_text=5, words_per_text_line=3):
         # Reformats a text string into chunks of words_per_text_line words, up to words_per_text total
         words = text.split()
@@ -301,23 +713,188 @@ class Graph():
 
         return "\n".join(formatted_words)
 
+    def prep_texts(self, texts, words_per_text=5, words_per_text_line=3):
+        # Reformats a batch of text strings like prep_text in a single pass, splitting off only the words each label shows
+        line_slices = [slice(i, i + words_per_text_line) for i in range(0, words_per_text, words_per_text_line)]
+        max_words = line_slices[-1].stop if len(line_slices) > 0 else 0
+        formatted_texts = []
+        for text in texts:
+            words = text.split(None, max_words)
+            formatted_words = [' '.join(words[x]) for x in line_slices if x.start < len(words)]
+            if len(line_slices) > 0 and len(formatted_words) == len(line_slices):
+                formatted_words.append('...')
+            formatted_texts.append("\n".join(formatted_words))
+        return formatted_texts
+
+    def update_text_version(self, node_id):
+        # Marks the text of the node with ID(node_id) as changed and evicts its cached label
+        self.text_versions[node_id] = self.text_versions.get(node_id, 0) + 1
+        with self.cache_lock:
+            self.label_cache.pop(node_id, None)
+
+    def get_node_labels(self, node_ids, words_per_node=5, words_per_node_line=3, graph=None, text_versions=None):
+        # Returns display labels for nodes with IDs(node_ids), reusing labels cached under the node text version and
+        # formatting, compared with node text versions(text_versions) defaulting to the current ones
+        # Labels are only cached for current text versions, so a render of an older copy of the graph keeps no stale labels
+        if text_versions is None:
+            text_versions = self.text_versions
+        label_format = (words_per_node, words_per_node_line)
+        node_labels = [None] * len(node_ids)
+        miss_indices = []
+        with self.cache_lock:
+            for i, node_id in enumerate(node_ids):
+                cached_label = self.label_cache.get(node_id)
+                if cached_label is not None and cached_label[0] == (text_versions.get(node_id, 0), label_format):
+                    node_labels[i] = cached_label[1]
+                else:
+                    miss_indices.append(i)
+
+        # Format all uncached labels as one batch
+        miss_texts = self.prep_texts([self.get_node_attr(node_ids[i], self.text_attr, graph=graph) for i in miss_indices], 
+                                     words_per_text=words_per_node, words_per_text_line=words_per_node_line)
+        with self.cache_lock:
+            for i, node_text in zip(miss_indices, miss_texts):
+                node_id = node_ids[i]
+                if len(node_text) > 0:
+                    node_text += "\n"
+                node_text += f"(ID: {node_id})"
+                text_version = text_versions.get(node_id, 0)
+                if text_version == self.text_versions.get(node_id, 0):
+                    self.label_cache[node_id] = ((text_version, label_format), node_text)
+                node_labels[i] = node_text
+
+        return node_labels
+
+    def cache_layout_positions(self, node_positions, layout_key=None, version=None, text_versions=None):
+        # Stores node positions(node ID -> "x,y" in points) of a layout of the graph version(version) with node text
+        # versions(text_versions), defaulting to the current ones, e.g. as they were when a background layout started
+        if version is None:
+            version = self.version
+        if text_versions is None:
+            text_versions = self.text_versions
+        layout_positions = {node_id: (text_versions.get(node_id, 0), pos) for node_id, pos in node_positions.items()}
+        with self.cache_lock:
+            self.layout_cache[(version, layout_key)] = layout_positions
+            while len(self.layout_cache) > self.layout_cache_size:
+                del self.layout_cache[next(iter(self.layout_cache))]
+
+    def get_kept_positions(self, layout_key=None, text_versions=None):
+        # Returns cached node positions(node ID -> "x,y") from the latest layout with the same key(layout_key),
+        # leaving out nodes whose text has changed since, compared with node text versions(text_versions) defaulting to the current ones
+        if text_versions is None:
+            text_versions = self.text_versions
+        with self.cache_lock:
+            cache_keys = [x for x in self.layout_cache.keys() if x[1] == layout_key]
+            if len(cache_keys) == 0:
+                return {}
+            layout_positions = self.layout_cache[max(cache_keys, key=lambda x: x[0])]
+        return {node_id: pos for node_id, (text_version, pos) in layout_positions.items() 
+                if text_version == text_versions.get(node_id, 0)}
+
+    def get_aggregate_id(self, cluster_id, rank_id=None):
+        # Returns the ID of the summary node standing in for a collapsed cluster or rank
+        if rank_id is None:
+            return f"{self.aggregate_prefix}{cluster_id}"
+        return f"{self.aggregate_prefix}{cluster_id}{self.aggregate_sep}{rank_id}"
+
+    def get_quotient_graph(self, collapse_cluster_ids=None, max_cluster_nodes=None, max_rank_nodes=None, graph=None):
+        # Returns the graph with collapsed clusters and ranks merged into summary nodes as:
+        # node groups(node ID -> summary node ID), summary nodes(summary node ID -> (cluster ID, rank ID, node count))
+        # and weighted edges((from ID, to ID) -> number of merged edges)
+        if collapse_cluster_ids is None:
+            collapse_cluster_ids = []
+
+        node_groups = {}
+        aggregates = {}
+
+        # Collapse selected or oversized clusters, then oversized ranks of the remaining clusters
+        for cluster_id, cluster_ranks in self.get_clusters(graph=graph).items():
+            cluster_node_ids = self.get_cluster_node_ids(cluster_id, graph=graph)
+            if cluster_id in collapse_cluster_ids or (max_cluster_nodes is not None and len(cluster_node_ids) > max_cluster_nodes):
+                aggregate_id = self.get_aggregate_id(cluster_id)
+                aggregates[aggregate_id] = (cluster_id, None, len(cluster_node_ids))
+                for node_id in cluster_node_ids:
+                    node_groups[node_id] = aggregate_id
+                continue
+
+            for rank_id, rank_node_ids in cluster_ranks.items():
+                if max_rank_nodes is not None and len(rank_node_ids) > max_rank_nodes:
+                    aggregate_id = self.get_aggregate_id(cluster_id, rank_id)
+                    aggregates[aggregate_id] = (cluster_id, rank_id, len(rank_node_ids))
+                    for node_id in rank_node_ids:
+                        node_groups[node_id] = aggregate_id
+
+        # Merge edges between the same pair of summary nodes, dropping edges inside a summary node
+        quotient_edges = {}
+        for edge_id in self.get_edge_ids(graph=graph):
+            from_node_id, to_node_id = self.split_edge_id(edge_id)
+            from_group_id = node_groups.get(from_node_id, from_node_id)
+            to_group_id = node_groups.get(to_node_id, to_node_id)
+            if from_group_id == to_group_id and from_group_id in aggregates:
+                continue
+            quotient_edges[(from_group_id, to_group_id)] = quotient_edges.get((from_group_id, to_group_id), 0) + 1
+
+        return node_groups, aggregates, quotient_edges
+
+    def get_position_order(self, node_ids, node_positions, rankdir_lr=True):
+        # Returns node IDs(node_ids) ordered along their rank by kept positions(node_positions), followed by the nodes
+        # without a kept position in their original order
+        # Ranks run top to bottom with rankdir_lr, and Graphviz y coordinates grow upwards
+        def get_rank_pos(node_id):
+            x, y = node_positions[node_id].split(",")[:2]
+            return -float(y) if rankdir_lr else float(x)
+
+        kept_node_ids = sorted([x for x in node_ids if x in node_positions], key=get_rank_pos)
+        return kept_node_ids + [x for x in node_ids if x not in node_positions]
+
     def build_digraph(self, graph=None,
                       cluster_fillcolor='lightgrey', cluster_fontcolor='black', 
                       rank_fillcolor='white', rank_fontcolor='black', 
                       node_fillcolor='black', node_fontcolor='white', 
                       node_shape='box', node_style='rounded,filled',
                       edge_label='', edge_color='black',
-                      rankdir_lr=True, words_per_node=5, words_per_node_line=3):
+                      rankdir_lr=True, words_per_node=5, words_per_node_line=3,
+                      collapse_cluster_ids=None, max_cluster_nodes=None, max_rank_nodes=None,
+                      node_positions=None, compact=True, text_versions=None):
         # Builds a Digraph object from the graph
+        # Clusters in collapse_cluster_ids and clusters or ranks with more than max_cluster_nodes or max_rank_nodes
+        # nodes are drawn as single summary nodes joined by weighted edges
+        # Nodes in node_positions(node ID -> "x,y" in points) from an earlier layout are listed in the order of their
+        # positions along each rank, so dot, which starts from the input order, tends to keep them in place
+        # With compact, shared node and edge attributes are written once as defaults per rank and per graph,
+        # and each node or edge only lists the attributes that differ from them
+        # Node labels are cached under node text versions(text_versions), defaulting to the current ones, which a
+        # background render of a copy of the graph passes as they were when the copy was made
+        # graphviz is only imported when a Digraph is built, keeping it out of data-only uses of Graph
+        from graphviz import Digraph
+
         dot = Digraph()
 
         # Set graph rank direction to left-to-right if rankdir_lr is True
         if rankdir_lr:
             dot.graph_attr['rankdir'] = 'LR'
 
+        node_groups, aggregates, quotient_edges = self.get_quotient_graph(collapse_cluster_ids=collapse_cluster_ids, 
+                                                                          max_cluster_nodes=max_cluster_nodes, 
+                                                                          max_rank_nodes=max_rank_nodes, graph=graph)
+
+        # Default edge attributes
+        edge_defaults = {self.label_attr: edge_label, self.color_attr: edge_color}
+        if compact:
+            dot.attr('edge', **edge_defaults)
+
         # Create cluster and rank clusters
         for cluster_id, cluster_ranks in self.get_clusters(graph=graph).items():
             cluster_group_name = f"cluster_{cluster_id}"
+
+            # Draw a collapsed cluster as a single summary node
+            aggregate_id = self.get_aggregate_id(cluster_id)
+            if aggregate_id in aggregates:
+                dot.node(aggregate_id, f"{cluster_id}\n({aggregates[aggregate_id][2]} nodes)", 
+                         style='filled', fillcolor=node_fillcolor, 
+                         fontcolor=node_fontcolor, shape='box3d')
+                continue
+
             with dot.subgraph(name=cluster_group_name) as sub:
                 sub.attr(label=cluster_id, labeljust='l', 
                          labelloc='t', style='rounded,filled', 
@@ -332,7 +909,29 @@ class Graph():
                                       fillcolor=rank_fillcolor, fontcolor=rank_fontcolor, 
                                       margin='10', penwidth='0', 
                                       group=cluster_rank_group_name)
-                        for node_id in rank_node_ids:
+
+                        # Draw a collapsed rank as a single summary node
+                        aggregate_id = self.get_aggregate_id(cluster_id, rank_id)
+                        if aggregate_id in aggregates:
+                            rank_sub.node(aggregate_id, f"({aggregates[aggregate_id][2]} nodes)", 
+                                          style='filled', fillcolor=node_fillcolor, 
+                                          fontcolor=node_fontcolor, shape='box3d', 
+                                          group=cluster_rank_group_name)
+                            rank_node_ids = []
+
+                        # Default node attributes of the rank
+                        node_defaults = {self.style_attr: node_style, self.fillcolor_attr: node_fillcolor, 
+                                         self.fontcolor_attr: node_fontcolor, self.shape_attr: node_shape}
+                        if compact and len(rank_node_ids) > 0:
+                            rank_sub.attr('node', **node_defaults, penwidth='0', group=cluster_rank_group_name)
+
+                        if node_positions is not None and len(node_positions) > 0:
+                            rank_node_ids = self.get_position_order(rank_node_ids, node_positions, rankdir_lr=rankdir_lr)
+
+                        rank_node_labels = self.get_node_labels(rank_node_ids, words_per_node=words_per_node,
+                                                                words_per_node_line=words_per_node_line, graph=graph,
+                                                                text_versions=text_versions)
+                        for node_id, node_text in zip(rank_node_ids, rank_node_labels):
                             node_attr = {self.fillcolor_attr: node_fillcolor,
                                          self.fontcolor_attr: node_fontcolor,
                                          self.shape_attr: node_shape,
@@ -342,10 +941,10 @@ class Graph():
                                 if self.is_node_attr(node_id, attr_key, graph=graph):
                                     node_attr[attr_key] = self.get_node_attr(node_id, attr_key, graph=graph)
 
-                            node_text = f"{self.prep_text(self.get_node_attr(node_id, self.text_attr, graph=graph), words_per_text_line=words_per_node_line, words_per_text=words_per_node)}"
-                            if len(node_text) > 0:
-                                node_text += "\n"
-                            node_text += f"(ID: {node_id})"
+                            if compact:
+                                rank_sub.node(node_id, node_text, 
+                                              **{k: v for k, v in node_attr.items() if v != node_defaults[k]})
+                                continue
 
                             rank_sub.node(node_id, node_text, 
                                           style=node_attr[self.style_attr], fillcolor=node_attr[self.fillcolor_attr], 
@@ -354,15 +953,56 @@ class Graph():
                         rank_sub.graph_attr[self.rank_attr] = 'same'
 
         # Create edges
-        for edge_id, edge_attr in self.get_edges(graph=graph).items():
-            from_node_id, to_node_id = self.split_edge_id(edge_id)
+        for (from_node_id, to_node_id), edge_weight in quotient_edges.items():
+
+            # Edges touching a summary node are labeled with the number of edges they stand for
+            if from_node_id in aggregates or to_node_id in aggregates:
+                summary_attr = {} if compact else {self.color_attr: edge_color}
+                dot.edge(from_node_id, to_node_id, label=str(edge_weight), **summary_attr, 
+                         penwidth=str(round(1 + math.log2(edge_weight), 2)))
+                continue
+
             edge_attr = {self.label_attr: edge_label,
                          self.color_attr: edge_color} 
             for attr_key in list(edge_attr.keys()):
                 if self.is_edge_attr(from_node_id, to_node_id, attr_key, graph=graph):
                     edge_attr[attr_key] = self.get_edge_attr(from_node_id, to_node_id, attr_key, graph=graph)
+            if compact:
+                dot.edge(from_node_id, to_node_id, **{k: v for k, v in edge_attr.items() if v != edge_defaults[k]})
+                continue
             dot.edge(from_node_id, to_node_id, label=edge_attr[self.label_attr], color=edge_attr[self.color_attr])
 
+        # Draw each bundle edge as one bold edge between the clusters or ranks it joins
+        for bundle in self.get_bundles(graph=graph).values():
+            bundle_edge_ends = []
+            for bundle_end in [bundle[self.bundle_from_key], bundle[self.bundle_to_key]]:
+                bundle_node_ids = self.get_bundle_end_node_ids(bundle_end, graph=graph)
+                if len(bundle_node_ids) == 0:
+                    break
+
+                # Clip the edge at the border of the cluster or rank unless it is collapsed into a summary node
+                cluster_id, rank_id = bundle_end
+                clip_attr = None
+                if self.get_aggregate_id(cluster_id) not in aggregates:
+                    clip_attr = f"cluster_{cluster_id}" if rank_id is None else f"cluster_{cluster_id}_{rank_id}"
+                bundle_edge_ends.append((node_groups.get(bundle_node_ids[0], bundle_node_ids[0]), clip_attr))
+
+            if len(bundle_edge_ends) < 2:
+                continue
+
+            (from_node_id, ltail), (to_node_id, lhead) = bundle_edge_ends
+            bundle_attr = {**edge_defaults, **bundle[self.bundle_attr_key]}
+            if compact:
+                bundle_attr = {k: v for k, v in bundle_attr.items() if k not in edge_defaults or v != edge_defaults[k]}
+            clip_attrs = {}
+            if ltail is not None:
+                clip_attrs['ltail'] = ltail
+            if lhead is not None:
+                clip_attrs['lhead'] = lhead
+            dot.graph_attr['compound'] = 'true'
+            dot.edge(from_node_id, to_node_id, **{k: v for k, v in bundle_attr.items() if k in edge_defaults},
+                     style='bold', penwidth='2', **clip_attrs)
+
         return dot
 
     def get_edge_adjacency(self, graph=None):
@@ -433,6 +1073,110 @@ class Graph():
 
         return stack
 
+    def to_csr(self, graph=None):
+        # Returns node IDs, cluster IDs, ranks as (cluster ID, rank ID), the cluster and rank index of each node and the
+        # adjacency matrix (from node index, to node index) -> edge count in SciPy CSR format
+        # Ranks are told apart by their cluster, since clusters may reuse the same rank IDs
+        # The result for the graph itself is cached until the next edit, and bundle edges are left out until expanded
+        import numpy as np
+        from scipy import sparse
+
+        if graph is None or graph is self.graph:
+            if self.csr_cache is not None and self.csr_cache[0] == self.version:
+                return self.csr_cache[1]
+            graph = self.graph
+            cache = True
+        else:
+            cache = False
+
+        node_ids = self.get_node_ids(graph=graph)
+        node_indices = {node_id: i for i, node_id in enumerate(node_ids)}
+        cluster_ids = self.get_cluster_ids(graph=graph)
+        cluster_indices = {cluster_id: i for i, cluster_id in enumerate(cluster_ids)}
+        rank_indices = {}
+        for cluster_id in cluster_ids:
+            for rank_id in self.get_cluster_rank_ids(cluster_id, graph=graph):
+                rank_indices.setdefault((cluster_id, rank_id), len(rank_indices))
+
+        node_clusters = np.zeros(len(node_ids), dtype=np.int64)
+        node_ranks = np.zeros(len(node_ids), dtype=np.int64)
+        for i, node_id in enumerate(node_ids):
+            cluster_id = self.get_node_attr(node_id, self.cluster_attr, graph=graph)
+            node_clusters[i] = cluster_indices[cluster_id]
+            node_ranks[i] = rank_indices.setdefault((cluster_id, self.get_node_attr(node_id, self.rank_attr, graph=graph)), len(rank_indices))
+        rank_ids = list(rank_indices.keys())
+
+        # Edges to nodes missing from the graph are left out
+        from_indices = []
+        to_indices = []
+        for edge_id in self.get_edge_ids(graph=graph):
+            from_node_id, to_node_id = self.split_edge_id(edge_id)
+            if from_node_id in node_indices and to_node_id in node_indices:
+                from_indices.append(node_indices[from_node_id])
+                to_indices.append(node_indices[to_node_id])
+
+        adjacency = sparse.csr_matrix((np.ones(len(from_indices), dtype=np.int64), (from_indices, to_indices)),
+                                      shape=(len(node_ids), len(node_ids)))
+
+        result = (np.array(node_ids, dtype=object), cluster_ids, rank_ids, node_clusters, node_ranks, adjacency)
+        if cache:
+            self.csr_cache = (self.version, result)
+        return result
+
+    def get_node_degrees(self, graph=None):
+        # Returns node IDs with the in-degree and out-degree of each node
+        import numpy as np
+
+        node_ids, cluster_ids, rank_ids, node_clusters, node_ranks, adjacency = self.to_csr(graph=graph)
+        in_degrees = np.asarray(adjacency.sum(axis=0)).ravel()
+        out_degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+        return node_ids, in_degrees, out_degrees
+
+    def get_group_edge_counts(self, group_count, node_groups, adjacency):
+        # Returns the sparse matrix (from group index, to group index) -> edge count for nodes in groups(node_groups)
+        # It stays sparse since most pairs of groups, e.g. of thousands of ranks, have no edges between them
+        import numpy as np
+        from scipy import sparse
+
+        membership = sparse.csr_matrix((np.ones(len(node_groups), dtype=np.int64), (np.arange(len(node_groups)), node_groups)),
+                                       shape=(len(node_groups), group_count))
+        return (membership.T @ adjacency @ membership).tocoo()
+
+    def get_cluster_edge_counts(self, graph=None):
+        # Returns cluster IDs and the sparse matrix (from cluster index, to cluster index) -> edge count
+        node_ids, cluster_ids, rank_ids, node_clusters, node_ranks, adjacency = self.to_csr(graph=graph)
+        return cluster_ids, self.get_group_edge_counts(len(cluster_ids), node_clusters, adjacency)
+
+    def get_rank_edge_counts(self, graph=None):
+        # Returns ranks as (cluster ID, rank ID) and the sparse matrix (from rank index, to rank index) -> edge count
+        node_ids, cluster_ids, rank_ids, node_clusters, node_ranks, adjacency = self.to_csr(graph=graph)
+        return rank_ids, self.get_group_edge_counts(len(rank_ids), node_ranks, adjacency)
+
+    def get_pagerank(self, damping=0.85, max_iter=100, tol=1e-9, graph=None):
+        # Returns node IDs with the PageRank score of each node, computed by power iteration
+        import numpy as np
+
+        node_ids, cluster_ids, rank_ids, node_clusters, node_ranks, adjacency = self.to_csr(graph=graph)
+        n_nodes = len(node_ids)
+        if n_nodes == 0:
+            return node_ids, np.zeros(0)
+
+        # Each node passes its score evenly along its out-edges, and nodes without out-edges pass it to every node
+        out_degrees = np.asarray(adjacency.sum(axis=1)).ravel().astype(float)
+        dangling = out_degrees == 0
+        inv_out_degrees = np.divide(1.0, out_degrees, out=np.zeros(n_nodes), where=~dangling)
+        transition = adjacency.T.tocsr()
+
+        scores = np.full(n_nodes, 1.0 / n_nodes)
+        for _ in range(max_iter):
+            new_scores = damping * (transition @ (scores * inv_out_degrees) + scores[dangling].sum() / n_nodes) + (1 - damping) / n_nodes
+            converged = np.abs(new_scores - scores).sum() < tol
+            scores = new_scores
+            if converged:
+                break
+
+        return node_ids, scores
+
     # def get_node_paths(self, node_id, edge_adjacency=None, path=[], graph=None):
 
     #     if edge_adjacency is None:
@@ -0,0 +1,181 @@
+import functools
+import inspect
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Metrics():
+    def __init__(self, max_samples=10000):
+        # Latency samples kept per operation for percentiles
+        self.max_samples = max_samples
+
+        # Operation name -> call count, cumulative seconds, element count and recent latencies
+        self.calls = {}
+        self.seconds = {}
+        self.elements = {}
+        self.latencies = {}
+
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, elements=None):
+        # Records one call of an operation(name) taking seconds(seconds) over elements(elements)
+        with self.lock:
+            if name not in self.calls:
+                self.calls[name] = 0
+                self.seconds[name] = 0.0
+                self.elements[name] = 0
+                self.latencies[name] = deque(maxlen=self.max_samples)
+            self.calls[name] += 1
+            self.seconds[name] += seconds
+            if elements is not None:
+                self.elements[name] += elements
+            self.latencies[name].append(seconds)
+
+    def merge(self, metrics):
+        # Adds the calls recorded in other metrics(metrics), e.g. by a background job, to these metrics
+        with metrics.lock:
+            merged = {name: (metrics.calls[name], metrics.seconds[name], metrics.elements[name], list(metrics.latencies[name]))
+                      for name in metrics.calls}
+        with self.lock:
+            for name, (calls, seconds, elements, latencies) in merged.items():
+                if name not in self.calls:
+                    self.calls[name] = 0
+                    self.seconds[name] = 0.0
+                    self.elements[name] = 0
+                    self.latencies[name] = deque(maxlen=self.max_samples)
+                self.calls[name] += calls
+                self.seconds[name] += seconds
+                self.elements[name] += elements
+                self.latencies[name].extend(latencies)
+
+    @contextmanager
+    def timer(self, name, elements=None):
+        # Times the enclosed block as one call of an operation(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, elements=elements)
+
+    def timed(self, name=None):
+        # Decorator recording each call of a function as an operation(name), defaulting to the function name
+        def decorator(func):
+            operation_name = name if name is not None else func.__name__
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(operation_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get_percentile(self, name, percentile=95):
+        # Returns the percentile(percentile) latency in seconds of an operation(name)
+        latencies = sorted(self.latencies[name])
+        if len(latencies) == 0:
+            return 0.0
+        return latencies[max(0, math.ceil(percentile / 100 * len(latencies)) - 1)]
+
+    def to_dict(self):
+        # Returns metrics per operation sorted by cumulative time
+        with self.lock:
+            names = sorted(self.calls.keys(), key=lambda x: -self.seconds[x])
+            return {name: {"calls": self.calls[name],
+                           "total_seconds": self.seconds[name],
+                           "mean_seconds": self.seconds[name] / self.calls[name],
+                           "p95_seconds": self.get_percentile(name, 95),
+                           "elements": self.elements[name]}
+                    for name in names}
+
+    def to_prometheus(self, prefix="graphlit"):
+        # Returns metrics in the Prometheus text exposition format
+        lines = [f"# TYPE {prefix}_seconds summary",
+                 f"# TYPE {prefix}_elements_total counter"]
+        for name, metric in self.to_dict().items():
+            label = f'operation="{name}"'
+            lines.append(f"{prefix}_seconds{{{label},quantile=\"0.95\"}} {metric['p95_seconds']:.9f}")
+            lines.append(f"{prefix}_seconds_sum{{{label}}} {metric['total_seconds']:.9f}")
+            lines.append(f"{prefix}_seconds_count{{{label}}} {metric['calls']}")
+            lines.append(f"{prefix}_elements_total{{{label}}} {metric['elements']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        # Clears all recorded metrics
+        with self.lock:
+            self.calls = {}
+            self.seconds = {}
+            self.elements = {}
+            self.latencies = {}
+
+
+def get_id_param(method):
+    # Returns the position and name of the first ID parameter(*_id or *_ids) of a method(method), or None
+    try:
+        params = list(inspect.signature(method).parameters)
+    except (TypeError, ValueError):
+        return None
+    for i, param in enumerate(params):
+        if param.endswith("_id") or param.endswith("_ids"):
+            return i, param
+    return None
+
+
+def get_element_count(id_param, args, kwargs, result):
+    # Returns the number of elements a call works on: the IDs given to its ID parameter(id_param),
+    # or for calls without one the IDs it returns, or None when neither can be counted cheaply
+    if id_param is None:
+        if isinstance(result, (list, set)):
+            return len(result)
+        return None
+
+    i, param = id_param
+    if param in kwargs:
+        ids = kwargs[param]
+    elif i < len(args):
+        ids = args[i]
+    else:
+        return None
+    if ids is None:
+        return None
+    if isinstance(ids, (list, tuple, set, dict)):
+        return len(ids)
+    return 1
+
+
+def instrument_graph(graph, metrics):
+    # Records every outermost call of the public methods of a Graph(graph) in metrics(metrics) with the number
+    # of elements it works on, leaving out the calls methods make to each other
+    uninstrument_graph(graph)
+    graph.instrumented_methods = []
+    call_depth = threading.local()
+    for name in dir(type(graph)):
+        if name.startswith("_") or not callable(getattr(type(graph), name)):
+            continue
+        method = getattr(graph, name)
+        def wrapper(*args, method=method, name=name, id_param=get_id_param(method), **kwargs):
+            if getattr(call_depth, "depth", 0) > 0:
+                return method(*args, **kwargs)
+            call_depth.depth = 1
+            result = None
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                call_depth.depth = 0
+                metrics.record(f"Graph.{name}", seconds, elements=get_element_count(id_param, args, kwargs, result))
+        setattr(graph, name, functools.wraps(method)(wrapper))
+        graph.instrumented_methods.append(name)
+    return graph
+
+
+def uninstrument_graph(graph):
+    # Restores the uninstrumented methods of a Graph(graph)
+    for name in getattr(graph, "instrumented_methods", []):
+        if name in vars(graph):
+            delattr(graph, name)
+    graph.instrumented_methods = []
+    return graph
@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+class RenderCancelled(Exception):
+    # Raised when a render job is superseded by a newer one
+    pass
+
+
+def is_graphviz_available(engine="dot"):
+    # Returns boolean indicating if the Graphviz layout engine(engine) is installed
+    return shutil.which(engine) is not None
+
+
+def run_graphviz(source, engine="dot", output_format="svg", timeout=None, cancel_event=None):
+    # Runs the Graphviz layout engine(engine) on DOT source(source) and returns the output(output_format) as bytes
+    # A tuple of output formats(output_format) returns a tuple of outputs from a single layout
+    # Graphviz is killed when the timeout(timeout) in seconds passes or the event(cancel_event) is set
+    if isinstance(output_format, str):
+        return run_graphviz_process(get_graphviz_cmd(engine, [f"-T{output_format}"]), source, 
+                                    timeout=timeout, cancel_event=cancel_event)
+
+    # Each -o names the file for the -T before it
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_paths = [os.path.join(output_dir, f"layout{i}.{x}") for i, x in enumerate(output_format)]
+        cmd_args = []
+        for x, output_path in zip(output_format, output_paths):
+            cmd_args += [f"-T{x}", f"-o{output_path}"]
+        run_graphviz_process(get_graphviz_cmd(engine, cmd_args), source, timeout=timeout, cancel_event=cancel_event)
+
+        outputs = []
+        for output_path in output_paths:
+            with open(output_path, "rb") as f:
+                outputs.append(f.read())
+        return tuple(outputs)
+
+
+def get_graphviz_cmd(engine, cmd_args):
+    # Returns the command line running the Graphviz layout engine(engine) with arguments(cmd_args)
+    return [engine] + cmd_args
+
+
+def run_graphviz_process(cmd, source, timeout=None, cancel_event=None):
+    # Runs a Graphviz command(cmd) on DOT source(source) and returns its standard output as bytes
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    stdin = source.encode("utf-8")
+    while True:
+        try:
+            stdout, stderr = process.communicate(stdin, timeout=0.1)
+            break
+        except subprocess.TimeoutExpired:
+            stdin = None
+            if cancel_event is not None and cancel_event.is_set():
+                process.kill()
+                process.communicate()
+                raise RenderCancelled()
+            if deadline is not None and time.monotonic() > deadline:
+                process.kill()
+                process.communicate()
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=stdout, stderr=stderr)
+    return stdout
+
+
+def get_layout_positions(source, engine="dot", timeout=None, cancel_event=None):
+    # Returns node positions(node ID -> "x,y" in points) from a Graphviz layout of DOT source(source)
+    layout = run_graphviz(source, engine=engine, output_format="json", timeout=timeout, cancel_event=cancel_event)
+    return parse_layout_positions(layout)
+
+
+def get_layout_svg(source, engine="dot", timeout=None, cancel_event=None):
+    # Returns node positions(node ID -> "x,y" in points) and the SVG from a single Graphviz layout of DOT source(source)
+    layout, svg = run_graphviz(source, engine=engine, output_format=("json", "svg"), timeout=timeout, cancel_event=cancel_event)
+    return parse_layout_positions(layout), svg.decode("utf-8")
+
+
+def parse_layout_positions(layout):
+    # Returns node positions(node ID -> "x,y" in points) from Graphviz JSON output(layout)
+    layout = json.loads(layout)
+
+    # Clusters are listed with their member nodes(nodes) and have no position
+    node_positions = {}
+    for layout_object in layout.get("objects", []):
+        if "pos" in layout_object and "nodes" not in layout_object:
+            node_positions[layout_object["name"]] = layout_object["pos"]
+
+    return node_positions
+
+
+# Render modes from most to least detailed
+render_mode_descriptions = {"full": "full view",
+                            "simplified": "simplified view (node IDs only, sfdp layout)",
+                            "collapsed": "view with each rank collapsed into a summary node",
+                            "overview": "view with each cluster collapsed into a summary node",
+                            "sampled": "sampled view of a random selection of nodes"}
+
+# Budget multipliers of render modes that are cheaper per node and edge than the full view
+# The simplified view draws unlabelled nodes with sfdp, which scales far better than dot
+render_mode_budget_scales = {"simplified": 4}
+
+# Share of the time left that each render mode may use, keeping the rest for cheaper modes
+render_mode_timeout_share = 0.5
+
+
+def get_mode_timeout(deadline, render_mode=None):
+    # Returns the seconds a render mode(render_mode) may use before the deadline(deadline, time.monotonic() seconds)
+    # The last render mode may use all the time left
+    time_left = max(0, deadline - time.monotonic())
+    if render_mode == list(render_mode_descriptions)[-1]:
+        return time_left
+    return time_left * render_mode_timeout_share
+
+
+def get_render_modes(graph, digraph_kwargs, node_budget, engine="dot"):
+    # Yields render modes with their Digraph settings and layout engine, from most to least detailed
+    yield "full", digraph_kwargs, engine
+    yield "simplified", {**digraph_kwargs, "words_per_node": 0, "node_positions": None}, "sfdp"
+    yield "collapsed", {**digraph_kwargs, "max_rank_nodes": 1, "node_positions": None}, engine
+    yield "overview", {**digraph_kwargs, "collapse_cluster_ids": graph.get_cluster_ids(graph=digraph_kwargs.get("graph")), 
+                       "node_positions": None}, engine
+    yield "sampled", {**digraph_kwargs, "graph": graph.get_sampled_subgraph(node_budget, graph=digraph_kwargs.get("graph")), 
+                      "words_per_node": 0, "collapse_cluster_ids": None, "max_rank_nodes": None, "node_positions": None}, engine
+
+
+def get_render_size(graph, digraph_kwargs):
+    # Returns the number of nodes and edges a Digraph built with the settings(digraph_kwargs) would draw
+    node_groups, aggregates, quotient_edges = graph.get_quotient_graph(collapse_cluster_ids=digraph_kwargs.get("collapse_cluster_ids"),
+                                                                       max_cluster_nodes=digraph_kwargs.get("max_cluster_nodes"),
+                                                                       max_rank_nodes=digraph_kwargs.get("max_rank_nodes"),
+                                                                       graph=digraph_kwargs.get("graph"))
+    node_count = len(graph.get_node_ids(graph=digraph_kwargs.get("graph"))) - len(node_groups) + len(aggregates)
+    return node_count, len(quotient_edges)
+
+
+def render_digraph(graph, digraph_kwargs, node_budget=2000, edge_budget=5000, timeout=30, engine="dot", cancel_event=None,
+                   skip_modes=None):
+    # Returns the render mode, Digraph and SVG of the most detailed render mode that fits the node(node_budget)
+    # and edge(edge_budget) budgets and that Graphviz lays out within its share of a timeout(timeout) in seconds,
+    # leaving out render modes(skip_modes) already tried
+    # The SVG is None when Graphviz is not installed on the server or fails, leaving the layout to the browser
+    # The render mode is None when the timeout passes before any mode is laid out
+    deadline = time.monotonic() + timeout
+    for render_mode, render_kwargs, render_engine in get_render_modes(graph, digraph_kwargs, node_budget, engine=engine):
+        if cancel_event is not None and cancel_event.is_set():
+            raise RenderCancelled()
+        if time.monotonic() >= deadline:
+            break
+        if skip_modes is not None and render_mode in skip_modes:
+            continue
+
+        node_count, edge_count = get_render_size(graph, render_kwargs)
+        budget_scale = render_mode_budget_scales.get(render_mode, 1)
+        if render_mode != "sampled" and (node_count > node_budget * budget_scale or edge_count > edge_budget * budget_scale):
+            continue
+
+        digraph = graph.build_digraph(**render_kwargs)
+        if not is_graphviz_available(render_engine):
+            return render_mode, digraph, None
+
+        try:
+            svg = run_graphviz(digraph.source, engine=render_engine, output_format="svg", 
+                               timeout=get_mode_timeout(deadline, render_mode), cancel_event=cancel_event).decode("utf-8")
+            return render_mode, digraph, svg
+        except subprocess.TimeoutExpired:
+            continue
+        except (OSError, subprocess.CalledProcessError):
+            return render_mode, digraph, None
+
+    return None, None, None
+
+
+class RenderWorker():
+    def __init__(self, idle_timeout=60):
+        # Background thread running one render job at a time, stopping after idle_timeout seconds without jobs
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+        # Job waiting to run (job key, job function), key and cancel event of the running job
+        self.pending_job = None
+        self.running_key = None
+        self.cancel_event = None
+
+        # Last completed job (job key, result, error)
+        self.result = None
+
+    def submit(self, job_key, job):
+        # Queues a job(job) taking a cancel_event keyword, replacing any waiting job and cancelling the running one
+        with self.lock:
+            # The running job is still the latest one
+            if job_key == self.running_key and not self.cancel_event.is_set():
+                self.pending_job = None
+                return
+
+            if self.cancel_event is not None:
+                self.cancel_event.set()
+
+            # The last completed job is the latest one again
+            if self.result is not None and self.result[0] == job_key:
+                self.pending_job = None
+                return
+
+            self.pending_job = (job_key, job)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        # Runs queued jobs until the worker has been idle for idle_timeout seconds
+        while True:
+            self.wakeup.wait(self.idle_timeout)
+            self.wakeup.clear()
+            with self.lock:
+                if self.pending_job is None:
+                    if self.running_key is None:
+                        self.thread = None
+                        return
+                    continue
+                job_key, job = self.pending_job
+                self.pending_job = None
+                self.running_key = job_key
+                self.cancel_event = threading.Event()
+                cancel_event = self.cancel_event
+
+            result, error = None, None
+            try:
+                result = job(cancel_event=cancel_event)
+            except RenderCancelled:
+                cancel_event = None
+            except Exception as e:
+                error = e
+
+            with self.lock:
+                if cancel_event is not None:
+                    self.result = (job_key, result, error)
+                self.running_key = None
+                self.cancel_event = None
+                if self.pending_job is not None:
+                    self.wakeup.set()
+
+    def is_busy(self):
+        # Returns boolean indicating if a job is running or waiting
+        with self.lock:
+            return self.running_key is not None or self.pending_job is not None
+
+    def get_result(self):
+        # Returns the last completed job as (job key, result, error), or None
+        with self.lock:
+            return self.result
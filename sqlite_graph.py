@@ -0,0 +1,556 @@
+import json
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from copy import deepcopy
+from graph import Graph, graph_versions
+
+
+# Tables for nodes, edges and cluster/rank membership, with indexes on cluster, rank and edge endpoints,
+# and the inverted index over node text (token, node ID -> token count) searched by token prefix
+schema = """
+CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, cluster_id TEXT, rank_id TEXT, attrs TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS nodes_cluster_rank ON nodes (cluster_id, rank_id);
+CREATE TABLE IF NOT EXISTS edges (edge_id TEXT PRIMARY KEY, from_node_id TEXT NOT NULL, to_node_id TEXT NOT NULL, attrs TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS edges_from ON edges (from_node_id);
+CREATE INDEX IF NOT EXISTS edges_to ON edges (to_node_id);
+CREATE TABLE IF NOT EXISTS clusters (cluster_id TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS ranks (cluster_id TEXT NOT NULL, rank_id TEXT NOT NULL, PRIMARY KEY (cluster_id, rank_id));
+CREATE TABLE IF NOT EXISTS memberships (cluster_id TEXT NOT NULL, rank_id TEXT NOT NULL, node_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS memberships_cluster_rank ON memberships (cluster_id, rank_id);
+CREATE INDEX IF NOT EXISTS memberships_node ON memberships (node_id);
+CREATE TABLE IF NOT EXISTS bundles (bundle_id TEXT PRIMARY KEY, bundle TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS text_index (token TEXT NOT NULL, node_id TEXT NOT NULL, token_count INTEGER NOT NULL, 
+                                       PRIMARY KEY (token, node_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS text_index_node ON text_index (node_id);
+"""
+
+# Nodes read from the database at a time when building the text index
+text_index_batch_size = 10000
+
+
+class StoreRows(list):
+    def __init__(self, cursor):
+        # Rows of a query and the number of rows it changed(rowcount), fetched while the connection was locked
+        super().__init__(cursor.fetchall())
+        self.rowcount = cursor.rowcount
+
+    def fetchone(self):
+        return self[0] if len(self) > 0 else None
+
+    def fetchall(self):
+        return list(self)
+
+
+class LockedConnection():
+    def __init__(self, path):
+        # SQLite connection to a database file(path) shared by threads, such as the app and its background render,
+        # running one statement or locked block at a time
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.lock = threading.RLock()
+
+    def execute(self, sql, parameters=()):
+        # Runs a statement(sql) and returns all its rows
+        with self.lock:
+            return StoreRows(self.connection.execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        with self.lock:
+            self.connection.executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with self.lock:
+            self.connection.executescript(sql_script)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class AttrView(dict):
+    def __init__(self, store, table, key_column, key, attrs):
+        # Attributes of one node or edge, written back to its table(table) on every change
+        # As a dict it serialises to JSON as is, and its copies are plain dicts that no longer write to the table
+        super().__init__(attrs)
+        self.store = store
+        self.table = table
+        self.key_column = key_column
+        self.key = key
+
+    def __setitem__(self, attr_key, attr_val):
+        super().__setitem__(attr_key, attr_val)
+        self.save()
+
+    def __delitem__(self, attr_key):
+        super().__delitem__(attr_key)
+        self.save()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.save()
+
+    def setdefault(self, attr_key, default=None):
+        if attr_key not in self:
+            self[attr_key] = default
+        return self[attr_key]
+
+    def pop(self, *args):
+        attr_val = super().pop(*args)
+        self.save()
+        return attr_val
+
+    def popitem(self):
+        item = super().popitem()
+        self.save()
+        return item
+
+    def clear(self):
+        super().clear()
+        self.save()
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def save(self):
+        # Writes the attributes, keeping the indexed cluster and rank columns of nodes in step
+        if self.table == "nodes":
+            self.store.execute("UPDATE nodes SET cluster_id = ?, rank_id = ?, attrs = ? WHERE node_id = ?",
+                               (self.get("cluster"), self.get("rank"), json.dumps(self), self.key))
+        else:
+            self.store.execute(f"UPDATE {self.table} SET attrs = ? WHERE {self.key_column} = ?", (json.dumps(self), self.key))
+
+
+class NodesView(MutableMapping):
+    def __init__(self, store):
+        # Node ID -> node attributes, stored in the nodes table
+        self.store = store
+
+    def __getitem__(self, node_id):
+        row = self.store.execute("SELECT attrs FROM nodes WHERE node_id = ?", (node_id,)).fetchone()
+        if row is None:
+            raise KeyError(node_id)
+        return AttrView(self.store, "nodes", "node_id", node_id, json.loads(row[0]))
+
+    def __setitem__(self, node_id, node_attr):
+        node_attr = dict(node_attr)
+        self.store.execute("INSERT INTO nodes (node_id, cluster_id, rank_id, attrs) VALUES (?, ?, ?, ?) "
+                           "ON CONFLICT (node_id) DO UPDATE SET cluster_id = excluded.cluster_id, "
+                           "rank_id = excluded.rank_id, attrs = excluded.attrs",
+                           (node_id, node_attr.get("cluster"), node_attr.get("rank"), json.dumps(node_attr)))
+
+    def __delitem__(self, node_id):
+        if self.store.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,)).rowcount == 0:
+            raise KeyError(node_id)
+
+    def __contains__(self, node_id):
+        return self.store.execute("SELECT 1 FROM nodes WHERE node_id = ?", (node_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self.store.execute("SELECT node_id FROM nodes ORDER BY rowid").fetchall())
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+
+class EdgesView(MutableMapping):
+    def __init__(self, store, edge_sep):
+        # Edge ID -> edge attributes, stored in the edges table with indexed endpoints
+        self.store = store
+        self.edge_sep = edge_sep
+
+    def __getitem__(self, edge_id):
+        row = self.store.execute("SELECT attrs FROM edges WHERE edge_id = ?", (edge_id,)).fetchone()
+        if row is None:
+            raise KeyError(edge_id)
+        return AttrView(self.store, "edges", "edge_id", edge_id, json.loads(row[0]))
+
+    def __setitem__(self, edge_id, edge_attr):
+        from_node_id, to_node_id = edge_id.split(self.edge_sep)[:2]
+        self.store.execute("INSERT INTO edges (edge_id, from_node_id, to_node_id, attrs) VALUES (?, ?, ?, ?) "
+                           "ON CONFLICT (edge_id) DO UPDATE SET attrs = excluded.attrs",
+                           (edge_id, from_node_id, to_node_id, json.dumps(dict(edge_attr))))
+
+    def __delitem__(self, edge_id):
+        if self.store.execute("DELETE FROM edges WHERE edge_id = ?", (edge_id,)).rowcount == 0:
+            raise KeyError(edge_id)
+
+    def update(self, edges):
+        # Writes many edges(edge ID -> edge attributes) at once, serialising each shared attribute record once
+        edge_attr_json = {}
+        rows = []
+        for edge_id, edge_attr in edges.items():
+            if id(edge_attr) not in edge_attr_json:
+                edge_attr_json[id(edge_attr)] = json.dumps(dict(edge_attr))
+            rows.append((edge_id, *edge_id.split(self.edge_sep)[:2], edge_attr_json[id(edge_attr)]))
+        self.store.executemany("INSERT INTO edges (edge_id, from_node_id, to_node_id, attrs) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (edge_id) DO UPDATE SET attrs = excluded.attrs", rows)
+
+    def __contains__(self, edge_id):
+        return self.store.execute("SELECT 1 FROM edges WHERE edge_id = ?", (edge_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self.store.execute("SELECT edge_id FROM edges ORDER BY rowid").fetchall())
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+
+
+class BundlesView(MutableMapping):
+    def __init__(self, store):
+        # Bundle ID -> bundle edge, stored in the bundles table
+        self.store = store
+
+    def __getitem__(self, bundle_id):
+        row = self.store.execute("SELECT bundle FROM bundles WHERE bundle_id = ?", (bundle_id,)).fetchone()
+        if row is None:
+            raise KeyError(bundle_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, bundle_id, bundle):
+        self.store.execute("INSERT INTO bundles (bundle_id, bundle) VALUES (?, ?) "
+                           "ON CONFLICT (bundle_id) DO UPDATE SET bundle = excluded.bundle", (bundle_id, json.dumps(bundle)))
+
+    def __delitem__(self, bundle_id):
+        if self.store.execute("DELETE FROM bundles WHERE bundle_id = ?", (bundle_id,)).rowcount == 0:
+            raise KeyError(bundle_id)
+
+    def __iter__(self):
+        return (row[0] for row in self.store.execute("SELECT bundle_id FROM bundles ORDER BY rowid").fetchall())
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM bundles").fetchone()[0]
+
+
+class RanksView(MutableMapping):
+    def __init__(self, store, cluster_id):
+        # Rank ID -> list of node IDs for one cluster, stored in the ranks and memberships tables
+        self.store = store
+        self.cluster_id = cluster_id
+
+    def __getitem__(self, rank_id):
+        if self.store.execute("SELECT 1 FROM ranks WHERE cluster_id = ? AND rank_id = ?", (self.cluster_id, rank_id)).fetchone() is None:
+            raise KeyError(rank_id)
+        return [row[0] for row in self.store.execute("SELECT node_id FROM memberships WHERE cluster_id = ? AND rank_id = ? ORDER BY rowid",
+                                                     (self.cluster_id, rank_id)).fetchall()]
+
+    def __setitem__(self, rank_id, node_ids):
+        # Only appended or removed node IDs are written when the rank already exists
+        node_ids = list(node_ids)
+        self.store.execute("INSERT OR IGNORE INTO clusters (cluster_id) VALUES (?)", (self.cluster_id,))
+        self.store.execute("INSERT OR IGNORE INTO ranks (cluster_id, rank_id) VALUES (?, ?)", (self.cluster_id, rank_id))
+        old_node_ids = self[rank_id]
+
+        if node_ids[:len(old_node_ids)] == old_node_ids:
+            add_node_ids = node_ids[len(old_node_ids):]
+        else:
+            remove_node_ids = set(old_node_ids) - set(node_ids)
+            if [x for x in old_node_ids if x not in remove_node_ids] == node_ids:
+                self.store.executemany("DELETE FROM memberships WHERE cluster_id = ? AND rank_id = ? AND node_id = ?",
+                                       [(self.cluster_id, rank_id, x) for x in remove_node_ids])
+                add_node_ids = []
+            else:
+                self.store.execute("DELETE FROM memberships WHERE cluster_id = ? AND rank_id = ?", (self.cluster_id, rank_id))
+                add_node_ids = node_ids
+
+        self.store.executemany("INSERT INTO memberships (cluster_id, rank_id, node_id) VALUES (?, ?, ?)",
+                               [(self.cluster_id, rank_id, x) for x in add_node_ids])
+
+    def __delitem__(self, rank_id):
+        if self.store.execute("DELETE FROM ranks WHERE cluster_id = ? AND rank_id = ?", (self.cluster_id, rank_id)).rowcount == 0:
+            raise KeyError(rank_id)
+        self.store.execute("DELETE FROM memberships WHERE cluster_id = ? AND rank_id = ?", (self.cluster_id, rank_id))
+
+    def __contains__(self, rank_id):
+        return self.store.execute("SELECT 1 FROM ranks WHERE cluster_id = ? AND rank_id = ?", (self.cluster_id, rank_id)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self.store.execute("SELECT rank_id FROM ranks WHERE cluster_id = ? ORDER BY rowid",
+                                                     (self.cluster_id,)).fetchall())
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM ranks WHERE cluster_id = ?", (self.cluster_id,)).fetchone()[0]
+
+
+class ClustersView(MutableMapping):
+    def __init__(self, store):
+        # Cluster ID -> ranks of the cluster, stored in the clusters table
+        self.store = store
+
+    def __getitem__(self, cluster_id):
+        if cluster_id not in self:
+            raise KeyError(cluster_id)
+        return RanksView(self.store, cluster_id)
+
+    def __setitem__(self, cluster_id, cluster_ranks):
+        cluster_ranks = {rank_id: list(rank_node_ids) for rank_id, rank_node_ids in cluster_ranks.items()}
+        self.store.execute("INSERT OR IGNORE INTO clusters (cluster_id) VALUES (?)", (cluster_id,))
+        self.store.execute("DELETE FROM ranks WHERE cluster_id = ?", (cluster_id,))
+        self.store.execute("DELETE FROM memberships WHERE cluster_id = ?", (cluster_id,))
+        ranks = RanksView(self.store, cluster_id)
+        for rank_id, rank_node_ids in cluster_ranks.items():
+            ranks[rank_id] = rank_node_ids
+
+    def __delitem__(self, cluster_id):
+        if self.store.execute("DELETE FROM clusters WHERE cluster_id = ?", (cluster_id,)).rowcount == 0:
+            raise KeyError(cluster_id)
+        self.store.execute("DELETE FROM ranks WHERE cluster_id = ?", (cluster_id,))
+        self.store.execute("DELETE FROM memberships WHERE cluster_id = ?", (cluster_id,))
+
+    def __contains__(self, cluster_id):
+        return self.store.execute("SELECT 1 FROM clusters WHERE cluster_id = ?", (cluster_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self.store.execute("SELECT cluster_id FROM clusters ORDER BY rowid").fetchall())
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM clusters").fetchone()[0]
+
+
+class SQLiteGraph(Graph):
+    def __init__(self, path=":memory:"):
+        # Graph stored in a SQLite database file(path), with every edit written to the database as it happens
+        # The database is opened first since Graph builds the text index, which is kept in the database
+        self.path = path
+        self.store = LockedConnection(path)
+        self.store.executescript(schema)
+        self.transaction_depth = 0
+
+        super().__init__()
+
+        # The graph structure is read from and written to the database through dictionary views
+        self.graph = {self.clusters_key: ClustersView(self.store),
+                      self.nodes_key: NodesView(self.store),
+                      self.edges_key: EdgesView(self.store, self.edge_sep),
+                      self.bundles_key: BundlesView(self.store)}
+
+    @contextmanager
+    def transaction(self):
+        # Groups the enclosed edits into one database transaction, keeping other threads out until it ends
+        with self.store.lock:
+            if self.transaction_depth == 0:
+                self.store.execute("BEGIN")
+            self.transaction_depth += 1
+            try:
+                yield
+            except BaseException:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    self.store.execute("ROLLBACK")
+                raise
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.store.execute("COMMIT")
+
+    def import_graph(self, graph):
+        # Bulk loads a graph structure(graph) of dictionaries into the database
+        with self.transaction():
+            self.store.executemany("INSERT OR REPLACE INTO nodes (node_id, cluster_id, rank_id, attrs) VALUES (?, ?, ?, ?)",
+                                   [(node_id, node_attr.get(self.cluster_attr), node_attr.get(self.rank_attr), json.dumps(node_attr))
+                                    for node_id, node_attr in graph[self.nodes_key].items()])
+            self.store.executemany("INSERT OR REPLACE INTO edges (edge_id, from_node_id, to_node_id, attrs) VALUES (?, ?, ?, ?)",
+                                   [(edge_id, *self.split_edge_id(edge_id), json.dumps(edge_attr))
+                                    for edge_id, edge_attr in graph[self.edges_key].items()])
+            for cluster_id, cluster_ranks in graph[self.clusters_key].items():
+                self.graph[self.clusters_key][cluster_id] = cluster_ranks
+            for bundle_id, bundle in self.get_bundles(graph=graph).items():
+                self.graph[self.bundles_key][bundle_id] = bundle
+        self.version = next(graph_versions)
+        self.build_text_index()
+
+    def export_graph(self):
+        # Returns the whole graph as a structure of plain dictionaries, e.g. for JSON export
+        return self.load_graph(self.store.execute("SELECT cluster_id FROM clusters ORDER BY rowid").fetchall())
+
+    def copy_graph_structure(self, graph=None):
+        # The copy is read from the database as plain dictionaries rather than node by node through the views
+        if graph is not None and graph is not self.graph:
+            return super().copy_graph_structure(graph=graph)
+        return self.export_graph()
+
+    def is_cluster_rank_node_id(self, cluster_id, rank_id, node_id, graph=None):
+        if graph is not None and graph is not self.graph:
+            return super().is_cluster_rank_node_id(cluster_id, rank_id, node_id, graph=graph)
+        return self.store.execute("SELECT 1 FROM memberships WHERE node_id = ? AND cluster_id = ? AND rank_id = ?",
+                                  (node_id, cluster_id, rank_id)).fetchone() is not None
+
+    def build_text_index(self):
+        # Builds the text index table over the text of every node, reading the nodes in batches so the graph
+        # never has to fit in memory
+        with self.transaction():
+            self.store.execute("DELETE FROM text_index")
+            last_rowid = 0
+            while True:
+                node_rows = self.store.execute("SELECT rowid, node_id, attrs FROM nodes WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                               (last_rowid, text_index_batch_size))
+                if len(node_rows) == 0:
+                    break
+                self.store.executemany("INSERT INTO text_index (token, node_id, token_count) VALUES (?, ?, ?)",
+                                       [(token, node_id, count) for _, node_id, attrs in node_rows
+                                        for token, count in Counter(self.tokenize_text(json.loads(attrs).get(self.text_attr, ""))).items()])
+                last_rowid = node_rows[-1][0]
+
+    def index_node_text(self, node_id):
+        # Adds the text of the node with ID(node_id) to the text index table
+        node_text = self.get_node_by_id(node_id).get(self.text_attr, "")
+        self.store.executemany("INSERT INTO text_index (token, node_id, token_count) VALUES (?, ?, ?) "
+                               "ON CONFLICT (token, node_id) DO UPDATE SET token_count = token_count + excluded.token_count",
+                               [(token, node_id, count) for token, count in Counter(self.tokenize_text(node_text)).items()])
+
+    def unindex_node_text(self, node_id):
+        # Removes the text of the node with ID(node_id) from the text index table
+        self.store.execute("DELETE FROM text_index WHERE node_id = ?", (node_id,))
+
+    def get_prefix_tokens(self, prefix):
+        # Tokens sort by code point, so the tokens starting with a prefix(prefix) are one range of the token index
+        return [row[0] for row in self.store.execute("SELECT DISTINCT token FROM text_index WHERE token >= ? AND token < ? ORDER BY token",
+                                                     (prefix, prefix + "\U0010ffff"))]
+
+    def get_term_scores(self, term, prefix_search=True):
+        if prefix_search:
+            rows = self.store.execute("SELECT node_id, SUM(token_count) FROM text_index WHERE token >= ? AND token < ? GROUP BY node_id",
+                                      (term, term + "\U0010ffff"))
+        else:
+            rows = self.store.execute("SELECT node_id, token_count FROM text_index WHERE token = ?", (term,))
+        return dict(rows)
+
+    def load_graph(self, cluster_rows):
+        # Returns the clusters with IDs in rows(cluster_rows) as a structure of plain dictionaries,
+        # using the cluster and edge endpoint indexes
+        # The selected clusters table is shared by every thread, so it is filled and read under one lock
+        with self.store.lock:
+            self.store.execute("CREATE TEMP TABLE IF NOT EXISTS selected_clusters (cluster_id TEXT PRIMARY KEY)")
+            self.store.execute("DELETE FROM selected_clusters")
+            self.store.executemany("INSERT OR IGNORE INTO selected_clusters (cluster_id) VALUES (?)", cluster_rows)
+
+            subgraph = {self.clusters_key: {}, self.nodes_key: {}, self.edges_key: {}, self.bundles_key: {}}
+            for cluster_id, rank_id, node_id in self.store.execute("SELECT m.cluster_id, m.rank_id, m.node_id FROM memberships m "
+                                                                   "JOIN selected_clusters s ON s.cluster_id = m.cluster_id "
+                                                                   "JOIN clusters c ON c.cluster_id = m.cluster_id "
+                                                                   "JOIN ranks r ON r.cluster_id = m.cluster_id AND r.rank_id = m.rank_id "
+                                                                   "ORDER BY c.rowid, r.rowid, m.rowid"):
+                subgraph[self.clusters_key].setdefault(cluster_id, {}).setdefault(rank_id, []).append(node_id)
+            for node_id, attrs in self.store.execute("SELECT n.node_id, n.attrs FROM nodes n "
+                                                     "JOIN memberships m ON m.node_id = n.node_id "
+                                                     "JOIN selected_clusters s ON s.cluster_id = m.cluster_id ORDER BY n.rowid"):
+                subgraph[self.nodes_key][node_id] = json.loads(attrs)
+            for edge_id, attrs in self.store.execute("SELECT e.edge_id, e.attrs FROM edges e "
+                                                     "JOIN memberships a ON a.node_id = e.from_node_id "
+                                                     "JOIN selected_clusters sa ON sa.cluster_id = a.cluster_id "
+                                                     "JOIN memberships b ON b.node_id = e.to_node_id "
+                                                     "JOIN selected_clusters sb ON sb.cluster_id = b.cluster_id ORDER BY e.rowid"):
+                subgraph[self.edges_key][edge_id] = json.loads(attrs)
+
+        return self.load_bundles(subgraph)
+
+    def load_bundles(self, subgraph):
+        # Adds the bundle edges between clusters and ranks of a subgraph(subgraph) to it
+        for bundle_id, bundle in self.get_bundles().items():
+            if (self.is_bundle_end(bundle[self.bundle_from_key], graph=subgraph) and 
+                self.is_bundle_end(bundle[self.bundle_to_key], graph=subgraph)):
+                subgraph[self.bundles_key][bundle_id] = bundle
+        return subgraph
+
+    def get_cluster_subgraph(self, cluster_ids):
+        # Returns a subgraph containing only the clusters with IDs(cluster_ids)
+        return self.load_graph([(cluster_id,) for cluster_id in cluster_ids])
+
+    def get_subgraph(self, subgraph_node_ids, graph=None):
+        # Returns a subgraph containing only the specified subgraph_node_ids, queried from the database
+        if graph is not None and graph is not self.graph:
+            return super().get_subgraph(subgraph_node_ids, graph=graph)
+
+        subgraph = {self.clusters_key: {}, self.nodes_key: {}, self.edges_key: {}, self.bundles_key: {}}
+        if len(subgraph_node_ids) == 0:
+            return subgraph
+
+        # The selected nodes table is shared by every thread, so it is filled and read under one lock
+        with self.store.lock:
+            self.store.execute("CREATE TEMP TABLE IF NOT EXISTS selected_nodes (node_id TEXT PRIMARY KEY)")
+            self.store.execute("DELETE FROM selected_nodes")
+            self.store.executemany("INSERT OR IGNORE INTO selected_nodes (node_id) VALUES (?)", [(x,) for x in subgraph_node_ids])
+
+            for cluster_id, rank_id, node_id in self.store.execute("SELECT m.cluster_id, m.rank_id, m.node_id FROM memberships m "
+                                                                   "JOIN selected_nodes s ON s.node_id = m.node_id "
+                                                                   "JOIN clusters c ON c.cluster_id = m.cluster_id "
+                                                                   "JOIN ranks r ON r.cluster_id = m.cluster_id AND r.rank_id = m.rank_id "
+                                                                   "ORDER BY c.rowid, r.rowid, m.rowid"):
+                subgraph[self.clusters_key].setdefault(cluster_id, {}).setdefault(rank_id, []).append(node_id)
+            for node_id, attrs in self.store.execute("SELECT n.node_id, n.attrs FROM nodes n "
+                                                     "JOIN selected_nodes s ON s.node_id = n.node_id ORDER BY n.rowid"):
+                subgraph[self.nodes_key][node_id] = json.loads(attrs)
+            for edge_id, attrs in self.store.execute("SELECT e.edge_id, e.attrs FROM edges e "
+                                                     "JOIN selected_nodes a ON a.node_id = e.from_node_id "
+                                                     "JOIN selected_nodes b ON b.node_id = e.to_node_id ORDER BY e.rowid"):
+                subgraph[self.edges_key][edge_id] = json.loads(attrs)
+
+        return self.load_bundles(subgraph)
+
+    def add_nodes(self, node_attr, node_ids=None, graph=None):
+        with self.transaction():
+            return super().add_nodes(node_attr, node_ids=node_ids, graph=graph)
+
+    def remove_nodes(self, node_ids, edit_mode=False, graph=None):
+        if graph is not None and graph is not self.graph:
+            return super().remove_nodes(node_ids, edit_mode=edit_mode, graph=graph)
+
+        if type(node_ids) != list:
+            node_ids = list([node_ids])
+
+        # Remove edges connected to the nodes through the endpoint indexes instead of scanning every edge
+        with self.transaction():
+            if not edit_mode:
+                self.store.executemany("DELETE FROM edges WHERE from_node_id = ? OR to_node_id = ?", [(x, x) for x in node_ids])
+            return super().remove_nodes(node_ids, edit_mode=True, graph=graph)
+
+    def add_edges(self, from_node_ids, to_node_ids, edge_attr={}, graph=None):
+        with self.transaction():
+            return super().add_edges(from_node_ids, to_node_ids, edge_attr=edge_attr, graph=graph)
+
+    def add_edges_bulk(self, from_node_ids, to_node_ids, edge_attr=None, chunk_size=None, graph=None):
+        with self.transaction():
+            return super().add_edges_bulk(from_node_ids, to_node_ids, edge_attr=edge_attr, chunk_size=chunk_size, graph=graph)
+
+    def set_edge_attr(self, from_node_id, to_node_id, attr_key, attr_val, graph=None):
+        with self.transaction():
+            return super().set_edge_attr(from_node_id, to_node_id, attr_key, attr_val, graph=graph)
+
+    def remove_edges(self, from_node_ids, to_node_ids, graph=None):
+        with self.transaction():
+            return super().remove_edges(from_node_ids, to_node_ids, graph=graph)
+
+    def add_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, edge_attr=None, graph=None):
+        with self.transaction():
+            return super().add_bundle(from_cluster_id, to_cluster_id, from_rank_id=from_rank_id, to_rank_id=to_rank_id, 
+                                      edge_attr=edge_attr, graph=graph)
+
+    def remove_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, graph=None):
+        with self.transaction():
+            return super().remove_bundle(from_cluster_id, to_cluster_id, from_rank_id=from_rank_id, to_rank_id=to_rank_id, graph=graph)
+
+    def expand_bundles(self, bundle_ids=None, graph=None):
+        with self.transaction():
+            return super().expand_bundles(bundle_ids=bundle_ids, graph=graph)
+
+    def rename_cluster_rank_id(self, old_cluster_id, old_rank_id, new_cluster_id, new_rank_id, graph=None):
+        with self.transaction():
+            return super().rename_cluster_rank_id(old_cluster_id, old_rank_id, new_cluster_id, new_rank_id, graph=graph)
+
+    def rename_cluster_id(self, old_cluster_id, new_cluster_id, graph=None):
+        with self.transaction():
+            return super().rename_cluster_id(old_cluster_id, new_cluster_id, graph=graph)
+
+    def close(self):
+        # Closes the database connection
+        self.store.close()
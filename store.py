@@ -0,0 +1,414 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from graph import Graph, graph_versions
+
+
+class ReadWriteLock():
+    def __init__(self):
+        # Many readers or one writer at a time
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+
+    @contextmanager
+    def read(self):
+        # Holds the lock for reading
+        with self.condition:
+            while self.writing:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        # Holds the lock for writing
+        with self.condition:
+            while self.writing or self.readers > 0:
+                self.condition.wait()
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class OverlayView(MutableMapping):
+    def __init__(self, base):
+        # Dictionary of this session's changed entries(changes) and removed keys(removed) layered over a shared dictionary(base)
+        # Changed entries keep their place in the shared order and new entries follow it
+        self.base = base
+        self.changes = {}
+        self.removed = set()
+        self.added = 0
+
+    def get_base(self, key):
+        # Returns the shared value of a key(key)
+        return self.base[key]
+
+    def is_shared(self, key):
+        # Returns boolean indicating if a key(key) still reads the shared value
+        return key not in self.changes and key not in self.removed and key in self.base
+
+    def is_added(self, key):
+        # Returns boolean indicating if a key(key) is listed after the shared keys
+        return key not in self.base or key in self.removed
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.get_base(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.changes and self.is_added(key):
+            self.added += 1
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.changes:
+            if self.is_added(key):
+                self.added -= 1
+            del self.changes[key]
+        if key in self.base:
+            self.removed.add(key)
+
+    def __contains__(self, key):
+        return key in self.changes or (key not in self.removed and key in self.base)
+
+    def __iter__(self):
+        for key in self.base:
+            if key not in self.removed:
+                yield key
+        for key in self.changes:
+            if self.is_added(key):
+                yield key
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + self.added
+
+
+class RanksOverlayView(OverlayView):
+    def get_base(self, rank_id):
+        # Rank lists are extended in place, so each read of a shared rank gets its own copy
+        return list(self.base[rank_id])
+
+
+class ClustersOverlayView(OverlayView):
+    def get_base(self, cluster_id):
+        # Ranks of a shared cluster are edited in place, so the cluster gets its own overlay on first read
+        cluster_ranks = RanksOverlayView(self.base[cluster_id])
+        self.changes[cluster_id] = cluster_ranks
+        return cluster_ranks
+
+
+class SessionGraph(Graph):
+    def __init__(self, shared_graph):
+        # A session's view of a shared Graph(shared_graph) that layers its edits over the shared graph
+        super().__init__()
+
+        self.shared = True
+
+        # Share the graph structure, text index and version of the shared graph until the first edit
+        self.graph = shared_graph.graph
+        self.text_index = shared_graph.text_index
+        self.text_index_tokens = shared_graph.text_index_tokens
+        self.text_versions = shared_graph.text_versions
+        self.version = shared_graph.version
+
+    def detach(self):
+        # Keeps this session's edits in overlays of the shared graph and text index, which are never changed (copy-on-write)
+        if self.shared:
+            self.graph = {self.clusters_key: ClustersOverlayView(self.get_clusters()),
+                          self.nodes_key: OverlayView(self.get_nodes()),
+                          self.edges_key: OverlayView(self.get_edges()),
+                          self.bundles_key: OverlayView(self.get_bundles())}
+            self.text_index = OverlayView(self.text_index)
+            self.text_index_tokens = list(self.text_index_tokens)
+            self.text_versions = dict(self.text_versions)
+            self.shared = False
+
+    def is_writable(self, graph):
+        # Detaches from the shared graph if an edit targets it, returning the graph to edit
+        if graph is None or graph is self.graph:
+            self.detach()
+            return self.graph
+        return graph
+
+    def copy_shared_nodes(self, node_ids, graph):
+        # Copies the shared attributes of nodes(node_ids) into the overlay before they are edited in place
+        nodes = self.get_nodes(graph=graph)
+        if isinstance(nodes, OverlayView):
+            for node_id in node_ids:
+                if nodes.is_shared(node_id):
+                    nodes[node_id] = dict(nodes[node_id])
+
+    def copy_shared_postings(self, node_id):
+        # Copies the shared text index entries of the tokens of a node(node_id) into the overlay before they are edited
+        if isinstance(self.text_index, OverlayView):
+            for token in set(self.tokenize_text(self.get_node_by_id(node_id).get(self.text_attr, ""))):
+                if self.text_index.is_shared(token):
+                    self.text_index[token] = dict(self.text_index[token])
+
+    def export_graph(self):
+        # Returns the whole graph as a structure of plain dictionaries, e.g. for JSON export
+        if self.shared:
+            return self.graph
+        return self.copy_graph_structure()
+
+    def get_subgraph(self, subgraph_node_ids, graph=None):
+        # Subgraphs are copied from plain dictionaries rather than the overlays
+        if graph is None or graph is self.graph:
+            graph = self.export_graph()
+        return super().get_subgraph(subgraph_node_ids, graph=graph)
+
+    def index_node_text(self, node_id):
+        self.copy_shared_postings(node_id)
+        return super().index_node_text(node_id)
+
+    def unindex_node_text(self, node_id):
+        self.copy_shared_postings(node_id)
+        return super().unindex_node_text(node_id)
+
+    def add_nodes(self, node_attr, node_ids=None, graph=None):
+        return super().add_nodes(node_attr, node_ids=node_ids, graph=self.is_writable(graph))
+
+    def remove_nodes(self, node_ids, edit_mode=False, graph=None):
+        return super().remove_nodes(node_ids, edit_mode=edit_mode, graph=self.is_writable(graph))
+
+    def add_edges(self, from_node_ids, to_node_ids, edge_attr={}, graph=None):
+        return super().add_edges(from_node_ids, to_node_ids, edge_attr=edge_attr, graph=self.is_writable(graph))
+
+    def add_edges_bulk(self, from_node_ids, to_node_ids, edge_attr=None, chunk_size=None, graph=None):
+        return super().add_edges_bulk(from_node_ids, to_node_ids, edge_attr=edge_attr, chunk_size=chunk_size, graph=self.is_writable(graph))
+
+    def set_edge_attr(self, from_node_id, to_node_id, attr_key, attr_val, graph=None):
+        return super().set_edge_attr(from_node_id, to_node_id, attr_key, attr_val, graph=self.is_writable(graph))
+
+    def remove_edges(self, from_node_ids, to_node_ids, graph=None):
+        return super().remove_edges(from_node_ids, to_node_ids, graph=self.is_writable(graph))
+
+    def add_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, edge_attr=None, graph=None):
+        return super().add_bundle(from_cluster_id, to_cluster_id, from_rank_id=from_rank_id, to_rank_id=to_rank_id, 
+                                  edge_attr=edge_attr, graph=self.is_writable(graph))
+
+    def remove_bundle(self, from_cluster_id, to_cluster_id, from_rank_id=None, to_rank_id=None, graph=None):
+        return super().remove_bundle(from_cluster_id, to_cluster_id, from_rank_id=from_rank_id, to_rank_id=to_rank_id, 
+                                     graph=self.is_writable(graph))
+
+    def expand_bundles(self, bundle_ids=None, graph=None):
+        return super().expand_bundles(bundle_ids=bundle_ids, graph=self.is_writable(graph))
+
+    def rename_cluster_rank_id(self, old_cluster_id, old_rank_id, new_cluster_id, new_rank_id, graph=None):
+        graph = self.is_writable(graph)
+        self.copy_shared_nodes(self.get_cluster_rank_node_ids(old_cluster_id, old_rank_id, graph=graph), graph)
+        if new_cluster_id in self.get_cluster_ids(graph=graph) and new_rank_id in self.get_cluster_rank_ids(new_cluster_id, graph=graph):
+            self.copy_shared_nodes(self.get_cluster_rank_node_ids(new_cluster_id, new_rank_id, graph=graph), graph)
+        return super().rename_cluster_rank_id(old_cluster_id, old_rank_id, new_cluster_id, new_rank_id, graph=graph)
+
+    def rename_cluster_id(self, old_cluster_id, new_cluster_id, graph=None):
+        graph = self.is_writable(graph)
+        self.copy_shared_nodes(self.get_cluster_node_ids(old_cluster_id, graph=graph), graph)
+        if new_cluster_id in self.get_cluster_ids(graph=graph):
+            self.copy_shared_nodes(self.get_cluster_node_ids(new_cluster_id, graph=graph), graph)
+        return super().rename_cluster_id(old_cluster_id, new_cluster_id, graph=graph)
+
+
+def parse_graph_shard(content):
+    # Returns the graph structure parsed from graph JSON content(content)
+    return json.loads(content)
+
+
+def read_graph_shard(path):
+    # Returns the graph structure read from a graph JSON file(path)
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+# Total size in bytes of graph JSON shards below which they are parsed in this process, and the fewest worker processes
+# worth starting, measured on 13 MB of shards sharing no nodes: serial loading takes 0.068 s/MB, a worker 0.084 s/MB
+# of its shards, joining in the parent (mostly unpickling) 0.022 s/MB and starting the workers about 0.2 s,
+# so 3 workers are faster from about 11 MB and 2 workers never gain more than a few percent
+min_parallel_shard_bytes = 16 * 1024 * 1024
+min_parallel_workers = 3
+
+# Node conflict rules that give the same result when groups of shards are merged first
+group_node_conflicts = ["first", "last", "merge"]
+
+
+def merge_graph_shard_group(parse_shard, shards, node_conflict):
+    # Returns a run of shards(shards) parsed by a function(parse_shard) and merged by a node conflict rule(node_conflict) as
+    # (merged graph structure with only the nodes placed by the shard cluster lists, nodes placed by their attributes
+    # instead, text index of the merged nodes, whether every listed node is in the run, graph structures for an exact merge)
+    # The graph structures for an exact merge hold the merged nodes, edges and bundle edges in the first one
+    # and the clusters of each shard, so merging them places nodes as if the shards themselves were merged
+    graphs = [parse_shard(x) for x in shards]
+    merged = Graph.merge(*graphs, node_conflict=node_conflict)
+
+    # Take the nodes placed by their attributes back out of the clusters, dropping the ranks and clusters only they filled
+    listed_node_ids = set()
+    for graph in graphs:
+        for cluster_ranks in merged.get_clusters(graph=graph).values():
+            for rank_node_ids in cluster_ranks.values():
+                listed_node_ids.update(rank_node_ids)
+    missing_node_ids = [x for x in merged.get_nodes() if x not in listed_node_ids]
+    if len(missing_node_ids) > 0:
+        missing_node_id_set = set(missing_node_ids)
+        for cluster_id, cluster_ranks in list(merged.get_clusters().items()):
+            for rank_id, rank_node_ids in list(cluster_ranks.items()):
+                cluster_ranks[rank_id] = [x for x in rank_node_ids if x not in missing_node_id_set]
+                if len(cluster_ranks[rank_id]) == 0:
+                    del cluster_ranks[rank_id]
+            if len(cluster_ranks) == 0:
+                del merged.get_clusters()[cluster_id]
+
+    exact_graphs = ([{**merged.graph, merged.clusters_key: graphs[0][merged.clusters_key]}] + 
+                    [{merged.clusters_key: graph[merged.clusters_key], merged.nodes_key: {}, merged.edges_key: {}} 
+                     for graph in graphs[1:]])
+    return (merged.graph, missing_node_ids, merged.text_index, listed_node_ids.issubset(merged.get_nodes()), exact_graphs)
+
+
+def concat_graph_shard_groups(group_results, node_conflict="last"):
+    # Returns a Graph joining merged runs of shards(group_results) from merge_graph_shard_group in order
+    # Runs sharing no nodes are joined without looking at single nodes: their nodes, edges, rank lists and text index
+    # entries are concatenated and only the nodes placed by their attributes are placed again after every listed node
+    # Runs sharing nodes, or listing nodes of other runs, are merged exactly by a node conflict rule(node_conflict)
+    joined = Graph()
+    joined_nodes = joined.get_nodes()
+    node_count = 0
+    for graph, _, _, _, _ in group_results:
+        joined_nodes.update(joined.get_nodes(graph=graph))
+        node_count += len(joined.get_nodes(graph=graph))
+    if node_count != len(joined_nodes) or not all(x[3] for x in group_results):
+        return Graph.merge(*itertools.chain.from_iterable(x[4] for x in group_results), node_conflict=node_conflict)
+
+    joined_clusters = joined.get_clusters()
+    for graph, _, text_index, _, _ in group_results:
+        joined.get_edges().update(joined.get_edges(graph=graph))
+        joined.get_bundles().update(joined.get_bundles(graph=graph))
+        for cluster_id, cluster_ranks in joined.get_clusters(graph=graph).items():
+            joined_cluster_ranks = joined_clusters.setdefault(cluster_id, {})
+            for rank_id, rank_node_ids in cluster_ranks.items():
+                joined_cluster_ranks.setdefault(rank_id, []).extend(rank_node_ids)
+        for token, token_node_ids in text_index.items():
+            joined.text_index.setdefault(token, {}).update(token_node_ids)
+
+    for _, missing_node_ids, _, _, _ in group_results:
+        for node_id in missing_node_ids:
+            node_attr = joined_nodes[node_id]
+            if joined.cluster_attr in node_attr and joined.rank_attr in node_attr:
+                joined_clusters.setdefault(node_attr[joined.cluster_attr], {}).setdefault(node_attr[joined.rank_attr], []).append(node_id)
+
+    joined.text_index_tokens = sorted(joined.text_index)
+    joined.version = next(graph_versions)
+    return joined
+
+
+def merge_graph_shards(parse_shard, shards, shard_bytes, node_conflict="last", max_workers=None, min_parallel_bytes=None):
+    # Returns a Graph merging shards(shards) of shard_bytes bytes in total, parsed by a function(parse_shard)
+    # in this process when they are smaller than min_parallel_bytes, defaulting to min_parallel_shard_bytes
+    # Large uploads are parsed in worker processes, which also merge runs of consecutive shards and index their text,
+    # so the parent only joins one run per worker, unless renamed node IDs or errors must number each shard
+    # Worker processes are spawned so they do not inherit the threads of the calling process
+    if min_parallel_bytes is None:
+        min_parallel_bytes = min_parallel_shard_bytes
+    worker_count = min(len(shards), max_workers or os.cpu_count() or 1)
+    if worker_count < min_parallel_workers or shard_bytes < min_parallel_bytes:
+        return Graph.merge(*[parse_shard(x) for x in shards], node_conflict=node_conflict)
+
+    group_size = -(-len(shards) // worker_count) if node_conflict in group_node_conflicts else 1
+    groups = [shards[i:i + group_size] for i in range(0, len(shards), group_size)]
+    with ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context("spawn")) as executor:
+        group_results = list(executor.map(merge_graph_shard_group, [parse_shard] * len(groups), groups, 
+                                          [node_conflict] * len(groups)))
+    return concat_graph_shard_groups(group_results, node_conflict=node_conflict)
+
+
+def load_graph_files(paths, node_conflict="last", max_workers=None, min_parallel_bytes=None):
+    # Returns a Graph merging graph JSON files(paths), parsed in parallel worker processes when they are large
+    paths = list(paths)
+    return merge_graph_shards(read_graph_shard, paths, sum(os.path.getsize(x) for x in paths), 
+                              node_conflict=node_conflict, max_workers=max_workers, min_parallel_bytes=min_parallel_bytes)
+
+
+class GraphRegistry():
+    def __init__(self, max_graphs=8):
+        # Shared read-only graphs keyed by the hash of their JSON content, oldest first
+        self.max_graphs = max_graphs
+        self.graphs = {}
+        self.lock = ReadWriteLock()
+
+    def get_content_hash(self, content):
+        # Returns the SHA-256 hash of graph JSON content(content) as bytes or text
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    def load_graph(self, content):
+        # Returns a session graph for graph JSON content(content), parsing it only the first time it is seen
+        content_hash = self.get_content_hash(content)
+
+        with self.lock.read():
+            shared_graph = self.graphs.get(content_hash)
+
+        if shared_graph is None:
+            # Parse outside the lock so other sessions keep reading while a large graph loads
+            graph_json = json.loads(content)
+            new_graph = Graph(clusters=graph_json["clusters"],
+                              nodes=graph_json["nodes"],
+                              edges=graph_json["edges"],
+                              bundles=graph_json.get("bundles"))
+            with self.lock.write():
+                shared_graph = self.graphs.setdefault(content_hash, new_graph)
+                while len(self.graphs) > self.max_graphs:
+                    del self.graphs[next(iter(self.graphs))]
+
+        return SessionGraph(shared_graph)
+
+    def load_graphs(self, contents, node_conflict="last", max_workers=None):
+        # Returns a session graph merging graph JSON shards(contents), parsing and merging them only the first time
+        # the same shards are seen in the same order with the same node conflict rule(node_conflict)
+        if len(contents) == 1:
+            return self.load_graph(contents[0])
+
+        content_hash = self.get_content_hash(" ".join([node_conflict] + [self.get_content_hash(x) for x in contents]))
+
+        with self.lock.read():
+            shared_graph = self.graphs.get(content_hash)
+
+        if shared_graph is None:
+            # Parse and merge outside the lock so other sessions keep reading while the shards load
+            new_graph = merge_graph_shards(parse_graph_shard, contents, sum(len(x) for x in contents), 
+                                           node_conflict=node_conflict, max_workers=max_workers)
+            with self.lock.write():
+                shared_graph = self.graphs.setdefault(content_hash, new_graph)
+                while len(self.graphs) > self.max_graphs:
+                    del self.graphs[next(iter(self.graphs))]
+
+        return SessionGraph(shared_graph)
+
+    def clear(self):
+        # Forgets all shared graphs (sessions keep the graphs they already use)
+        with self.lock.write():
+            self.graphs.clear()
+
+
+# Process-wide registry shared by every session
+graph_registry = GraphRegistry()